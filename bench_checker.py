@@ -0,0 +1,209 @@
+"""
+Benchmarks of the Test Checker JSON.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import test_checker
+
+
+CHECKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_checker.py")
+
+
+def _run_times(command, repeat):
+	"""
+	Runs `command` `repeat` times. Returns the list of wall times, in seconds.
+	"""
+	times = list()
+	for _ in range(repeat):
+		start = time.perf_counter()
+		subprocess.run(command, check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+		times.append(time.perf_counter() - start)
+	return times
+
+
+def _summary(times):
+	"""
+	Returns the statistics of the list of `times`, in milliseconds.
+	"""
+	return {"min_ms": min(times) * 1000, "median_ms": statistics.median(times) * 1000, "max_ms": max(times) * 1000}
+
+
+def bench_startup(repeat=20):
+	"""
+	Measures the startup of a new interpreter: bare, importing test_checker, and running a no-op check
+	(empty expected and record files) with the command line tool.
+	"""
+	with tempfile.TemporaryDirectory() as tmp:
+		expected = os.path.join(tmp, "expected.json")
+		record = os.path.join(tmp, "record.json")
+		for filename in (expected, record):
+			with open(filename, "w", encoding="utf-8") as fh:
+				fh.write("[]")
+		path = os.path.dirname(CHECKER)
+		return {
+			"interpreter": _summary(_run_times([sys.executable, "-c", "pass"], repeat)),
+			"import": _summary(_run_times([sys.executable, "-c", "import sys; sys.path.insert(0, {!r}); import test_checker".format(path)], repeat)),
+			"noop_check": _summary(_run_times([sys.executable, CHECKER, "-e", expected, "-r", record, "-o", os.path.join(tmp, "report.xml")], repeat)),
+		}
+
+
+FIELD_TYPES = ("number", "string", "list", "bool")
+PERIOD = 10 # Time between two recorded messages, in ms
+
+
+def _value(rnd, field_type):
+	"""
+	Returns a random value of `field_type`.
+	"""
+	if field_type == "number":
+		return rnd.choice([rnd.randint(-1000, 1000), round(rnd.uniform(-100, 100), 3)])
+	if field_type == "string":
+		return "".join(rnd.choice(string.ascii_letters) for _ in range(rnd.randint(3, 12)))
+	if field_type == "list":
+		return [rnd.randint(0, 255) for _ in range(rnd.randint(1, 8))]
+	return rnd.random() < 0.5
+
+
+def generate(seed=0, messages=1000, names=10, overlap=1.0, fields=4, types=FIELD_TYPES, errors=0.05):
+	"""
+	Returns a synthetic scenario: the JSON nodes of the Expecteds and of the recorded messages.
+	`messages` messages are recorded every PERIOD ms with `names` names, each with `fields` fields of the `types`
+	in turn. Each expects a message of the record, at a random time in its tolerance window.
+	The tolerance lets `overlap` messages of the same name fall in a window, on average.
+	A share `errors` of the messages has a wrong value, and as many Expecteds have no message.
+	The scenario only depends on the parameters.
+	"""
+	unknown = set(types) - set(FIELD_TYPES)
+	if unknown:
+		raise ValueError("Unknown field types: {}".format(", ".join(sorted(unknown))))
+	rnd = random.Random(seed)
+	tolerance = overlap * names * PERIOD / 2
+	keys = ["Field_{}".format(i) for i in range(fields)]
+	expecteds = list()
+	record = list()
+	for i in range(messages):
+		name = "msg_{}".format(rnd.randrange(names))
+		values = {key: _value(rnd, types[pos % len(types)]) for pos, key in enumerate(keys)}
+		sent = i * PERIOD
+		expecteds.append({"message": dict(values), "name": name, "time": sent + rnd.uniform(-tolerance, tolerance),
+			"checkMode": "one", "fieldsToCheck": keys, "tolerance": str(tolerance)})
+		draw = rnd.random()
+		if draw < errors:
+			key = rnd.choice(keys)
+			values[key] = _value(rnd, types[keys.index(key) % len(types)])
+		if draw < 1 - errors:
+			record.append({"message": values, "name": name, "time": sent})
+	return expecteds, record
+
+
+def _scale_phases(expected_nodes, record_nodes, report):
+	"""
+	Returns the phases of a check of the scenario as (name, function) pairs, to call in order.
+	"""
+	state = dict()
+
+	def build():
+		state["expecteds"] = [test_checker.Expected(n) for n in expected_nodes]
+		state["messages"] = [test_checker.Message(n) for n in record_nodes]
+
+	def fuzzy_sub():
+		for expected, message in zip(expected_nodes, record_nodes):
+			for key, value in expected["message"].items():
+				test_checker.fuzzy_sub(value, message["message"].get(key))
+
+	def candidates():
+		test_checker._candidates(state["expecteds"], state["messages"]) # pylint: disable=protected-access
+
+	def check():
+		chk = test_checker.Checker()
+		chk.check(state["expecteds"], state["messages"])
+		state["retained"] = chk.retained
+
+	def xml_report():
+		chk = test_checker.Checker()
+		chk.retained = state["retained"]
+		chk.to_xml(report)
+
+	return [("build", build), ("fuzzy_sub", fuzzy_sub), ("candidates", candidates), ("check", check), ("report", xml_report)]
+
+
+def bench_scale(repeat=3, **params):
+	"""
+	Measures each phase of a check of the scenario `generate(**params)`: wall time over `repeat` runs,
+	and peak of the memory allocated during the phase (measured in another run, traced).
+	"""
+	expected_nodes, record_nodes = generate(**params)
+	times = dict()
+	peaks = dict()
+	with tempfile.TemporaryDirectory() as tmp:
+		report = os.path.join(tmp, "report.xml")
+		for _ in range(repeat):
+			for name, phase in _scale_phases(expected_nodes, record_nodes, report):
+				start = time.perf_counter()
+				phase()
+				times.setdefault(name, list()).append(time.perf_counter() - start)
+		for name, phase in _scale_phases(expected_nodes, record_nodes, report):
+			tracemalloc.start()
+			phase()
+			peaks[name] = tracemalloc.get_traced_memory()[1] / (1 << 20)
+			tracemalloc.stop()
+	return {name: dict(_summary(runs), peak_mb=peaks[name]) for name, runs in times.items()}
+
+
+def compare(old, new):
+	"""
+	Returns the ratio of the median times of each phase (or command) of the `new` result to the `old` one,
+	both as printed by this script.
+	"""
+	return {name: new["result"][name]["median_ms"] / result["median_ms"]
+		for name, result in old["result"].items() if name in new["result"] and result["median_ms"]}
+
+
+def _main():
+	parser = argparse.ArgumentParser(description="Benchmarks of the Test Checker JSON")
+	subparsers = parser.add_subparsers(dest="bench", required=True)
+	startup = subparsers.add_parser("startup", help="Time of the interpreter startup, the import and a no-op check")
+	startup.add_argument('-n', '--repeat', type=int, default=20, help='Number of runs of each command')
+	scale = subparsers.add_parser("scale", help="Time and peak memory of each phase of a check of a synthetic scenario")
+	scale.add_argument('-n', '--repeat', type=int, default=3, help='Number of runs of each phase')
+	scale.add_argument('--seed', type=int, default=0, help='Seed of the scenario')
+	scale.add_argument('-m', '--messages', type=int, default=10000, help='Number of recorded messages')
+	scale.add_argument('--names', type=int, default=10, help='Number of message names')
+	scale.add_argument('--overlap', type=float, default=1.0, help='Average number of messages of the same name in a tolerance window')
+	scale.add_argument('--fields', type=int, default=4, help='Number of fields per message')
+	scale.add_argument('--types', type=lambda x: tuple(x.split(",")), default=FIELD_TYPES,
+		help='Types of the fields, in turn, among {}'.format(",".join(FIELD_TYPES)))
+	scale.add_argument('--errors', type=float, default=0.05, help='Share of wrong and of missing messages')
+	diff = subparsers.add_parser("compare", help="Ratios of the median times of two results of this script")
+	diff.add_argument('old', type=str, help='Reference result')
+	diff.add_argument('new', type=str, help='Compared result')
+	args = parser.parse_args()
+
+	output = {"bench": args.bench, "python": sys.version.split()[0], "checker": test_checker.__version__}
+	if args.bench == "startup":
+		output["result"] = bench_startup(args.repeat)
+	elif args.bench == "scale":
+		params = {key: getattr(args, key) for key in ("seed", "messages", "names", "overlap", "fields", "types", "errors")}
+		output["params"] = params
+		output["result"] = bench_scale(args.repeat, **params)
+	else:
+		with open(args.old, encoding="utf-8") as fh:
+			old = json.load(fh)
+		with open(args.new, encoding="utf-8") as fh:
+			new = json.load(fh)
+		output["result"] = compare(old, new)
+	print(json.dumps(output, indent="\t"))
+
+if __name__ == "__main__":
+	_main()
@@ -0,0 +1,128 @@
+"""
+Assignment of the Test Checker JSON: pairing of the Expecteds with their candidate Messages.
+"""
+
+import heapq
+
+
+def greedy_order(scores, times):
+	"""
+	Returns the positions of the pairs by score `scores[i]`, then by time of the Message `times[i]`:
+	the order in which the greedy assignment claims them.
+	Two stable sorts, the last by the main key, avoid building a key tuple per pair.
+	"""
+	order = sorted(range(len(scores)), key=times.__getitem__)
+	order.sort(key=scores.__getitem__)
+	return order
+
+
+def _cost(score):
+	"""
+	Returns the cost of retaining a pair of score `score` in the optimal assignment.
+	"""
+	cost = abs(score)
+	return cost if cost < _MAX_COST else _MAX_COST
+
+
+_MAX_COST = 1e15
+_ZERO = (0, 0.0)
+
+
+def optimal_order(expecteds, messages, scores, times):
+	"""
+	Returns the positions of the pairs retained by the optimal assignment, in order: each Expected and each Message
+	in at most one pair, with as many pairs as possible and, among those, the lowest sum of absolute scores.
+	The pair at position i is made of the Expected at position `expecteds[i]`, whose time is `times[expecteds[i]]`,
+	and of the Message at position `messages[i]`, with the score `scores[i]`.
+	The Expecteds are added one by one, in time order (see `_Assignment`).
+	"""
+	rows = dict()
+	for pair, exp in enumerate(expecteds):
+		rows.setdefault(exp, list()).append(pair)
+	assignment = _Assignment(messages, [_cost(score) for score in scores])
+	for exp in sorted(rows, key=times.__getitem__):
+		assignment.add(exp, rows[exp])
+	return sorted(pair for _, pair in assignment.mates.values() if pair is not None)
+
+
+class _Assignment(object):
+	"""
+	Minimum cost assignment of Expecteds (rows) to Messages (columns), with the Expecteds added one by one.
+	The Message of the pair at position i is `messages[i]`, for a cost `costs[i]`.
+	Each Expected also has a column of its own, taken when it stays without Message. Costs are pairs
+	(number of Expecteds without Message, sum of the pair costs), compared in this order.
+	Each Expected is assigned along a shortest augmenting path: Dijkstra on costs reduced by node potentials,
+	stopped at the first free column. On equal lengths free columns are reached first: with tied scores, as with
+	identical periodic messages, the search then ends in the tolerance window of the new Expected instead of
+	walking back through the columns claimed before. Longer paths are only searched when they lower the cost.
+	"""
+	def __init__(self, messages, costs):
+		self.messages = messages
+		self.costs = costs
+		self.arcs = dict() # Expected -> its arcs (column, cost, pair). Its own column is -1 - Expected.
+		self.row_potential = dict()
+		self.column_potential = dict() # Columns never reached are at _ZERO
+		self.mates = dict() # Column -> (Expected, pair) assigned to it, pair None for the own column of the Expected
+		self.visited = 0 # Columns reached by the searches, the cost of the assignment
+
+	def add(self, exp, pairs):
+		"""
+		Adds the Expected `exp` with its candidate `pairs`, and updates the assignment.
+		"""
+		arcs = self.arcs[exp] = [(self.messages[pair], (0, self.costs[pair]), pair) for pair in pairs] + [(-1 - exp, (1, 0.0), None)]
+		# The highest potential keeping the reduced costs of the arcs nonnegative.
+		potentials = self.column_potential
+		self.row_potential[exp] = max((potentials.get(col, _ZERO)[0] - cost[0], potentials.get(col, _ZERO)[1] - cost[1]) for col, cost, _ in arcs)
+		rows, columns, prev = self._shortest_paths(exp)
+		self.visited += len(columns)
+
+		end, (shortest_major, shortest_minor) = columns.popitem()
+		for row, ((major, minor), _) in rows.items():
+			potential = self.row_potential[row]
+			self.row_potential[row] = (potential[0] + major - shortest_major, potential[1] + minor - shortest_minor)
+		for col, (major, minor) in columns.items():
+			potential = potentials.get(col, _ZERO)
+			potentials[col] = (potential[0] + major - shortest_major, potential[1] + minor - shortest_minor)
+
+		col = end
+		while True:
+			row, pair = prev[col]
+			self.mates[col], col = (row, pair), rows[row][1]
+			if row == exp:
+				break
+
+	def _shortest_paths(self, exp):
+		"""
+		Dijkstra from the Expected `exp`, stopped at the first free column, reached last.
+		Returns the rows reached, with the length of their path and the column they were assigned to,
+		the columns reached, with the length of their path, and the predecessors (row, pair) of the columns.
+		"""
+		potentials = self.column_potential
+		rows = {exp: (_ZERO, None)}
+		columns = dict()
+		tentative = dict()
+		prev = dict()
+		heap = list()
+		row, (major, minor) = exp, _ZERO
+		while True:
+			row_major, row_minor = self.row_potential[row]
+			major += row_major
+			minor += row_minor
+			for col, (cost_major, cost_minor), pair in self.arcs[row]:
+				if col in columns:
+					continue
+				col_major, col_minor = potentials.get(col, _ZERO)
+				reached = (major + cost_major - col_major, minor + cost_minor - col_minor)
+				if col not in tentative or reached < tentative[col]:
+					tentative[col] = reached
+					prev[col] = (row, pair)
+					heapq.heappush(heap, (reached, col in self.mates, col))
+			(major, minor), _, col = heapq.heappop(heap)
+			while col in columns:
+				(major, minor), _, col = heapq.heappop(heap)
+			columns[col] = (major, minor)
+			if col not in self.mates:
+				return rows, columns, prev
+			# Assigned arcs have a null reduced cost: the row is reached at the length of its column.
+			row = self.mates[col][0]
+			rows[row] = ((major, minor), col)
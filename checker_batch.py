@@ -0,0 +1,59 @@
+"""
+Batch driver of the Test Checker JSON: scenarios of a manifest checked in one run.
+"""
+
+import itertools
+import os
+
+from checker_records import iter_records
+
+
+def _check_scenario(check, scenario, options):
+	"""
+	Worker of `check_batch`. Returns the result of `check` for `scenario` and the error raised, if any.
+	"""
+	try:
+		return check(scenario["expected"], scenario["record"], scenario["report"], options=options), None
+	except Exception as ex:
+		return -1, "{}: {}".format(type(ex).__name__, ex)
+
+
+def check_batch(scenarios, check, jobs=1, options=None):
+	"""
+	Checks each scenario of `scenarios`, a dict with the filenames "expected", "record" and "report",
+	with `check(expected, record, report, options=options)` (see test_checker.check_files).
+	Scenarios are checked in this process, or by `jobs` worker processes.
+	Returns the list of (result, error) pairs, in the order of `scenarios`.
+	"""
+	if jobs <= 1 or len(scenarios) <= 1:
+		return [_check_scenario(check, scenario, options) for scenario in scenarios]
+	import concurrent.futures # pylint: disable=import-outside-toplevel
+	with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+		return list(pool.map(_check_scenario, itertools.repeat(check), scenarios, itertools.repeat(options),
+			chunksize=max(1, len(scenarios) // (4 * jobs))))
+
+
+def read_manifest(filename):
+	"""
+	Returns the scenarios listed in the manifest `filename`, a JSON array or JSON Lines file
+	of objects with the keys "expected", "record" and "report".
+	Relative filenames are relative to the manifest.
+	"""
+	base = os.path.dirname(filename)
+	return [{key: os.path.join(base, node[key]) for key in ("expected", "record", "report")} for node in iter_records(filename)]
+
+
+def run_manifest(filename, check, jobs=1, options=None): # pragma: no cover
+	"""
+	Checks the scenarios of the manifest `filename` (see check_batch), and prints the failed ones.
+	Returns 0 if all passed, -1 otherwise.
+	"""
+	scenarios = read_manifest(filename)
+	results = check_batch(scenarios, check, jobs, options)
+	failed = 0
+	for scenario, (result, error) in zip(scenarios, results):
+		if result != 0:
+			failed += 1
+			print("FAILED {}{}".format(scenario["record"], " ({})".format(error) if error else ""))
+	print("{} scenarios, {} passed, {} failed".format(len(scenarios), len(scenarios) - failed, failed))
+	return -1 if failed else 0
@@ -0,0 +1,96 @@
+"""
+Cache of the Test Checker JSON: the Expecteds loaded from JSON files, pickled between runs.
+"""
+
+import json
+import os
+
+from checker_records import gc_paused
+
+
+_CACHE_FORMAT = 1 # Format of the entries of ExpectedCache: entries of another format are not read
+
+
+class ExpectedCache(object):
+	"""
+	On-disk cache of the Expecteds loaded from JSON files, pickled in the directory `directory`.
+	An entry is keyed by the content of the JSON file, the format of the entries and the version of the checker:
+	a changed file or checker gets a new entry. The least recently used entries are removed when they exceed `max_bytes`.
+	"""
+	SUFFIX = ".expecteds"
+
+	def __init__(self, directory, max_bytes=256 << 20):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+
+	def load(self, filename, build, version=""):
+		"""
+		Returns the list of Expected stored in the JSON file `filename`, from its entry if any.
+		Otherwise the Expecteds are built by `build(nodes)` from the JSON nodes of the file, and stored.
+		`version` identifies the code of the pickled classes (see test_checker._source_digest).
+		"""
+		import hashlib # pylint: disable=import-outside-toplevel
+		import pickle # pylint: disable=import-outside-toplevel
+		with open(filename, "rb") as fh:
+			data = fh.read()
+		key = hashlib.sha256("{}:{}:{}:".format(_CACHE_FORMAT, version, pickle.HIGHEST_PROTOCOL).encode())
+		key.update(data)
+		path = os.path.join(self.directory, key.hexdigest() + self.SUFFIX)
+		try:
+			with open(path, "rb") as fh, gc_paused():
+				expecteds = pickle.load(fh)
+		except Exception: # Missing, being evicted, or not readable by this checker: rebuilt
+			expecteds = None
+		if isinstance(expecteds, list):
+			self.hits += 1
+			try:
+				os.utime(path) # Most recently used. A read-only cache is still read.
+			except OSError:
+				pass
+			return expecteds
+		self.misses += 1
+		expecteds = build(json.loads(data))
+		self._store(path, expecteds)
+		return expecteds
+
+	def _store(self, path, expecteds):
+		"""
+		Writes the entry `path` of `expecteds`, then evicts the least recently used entries.
+		The entry is written in a temporary file renamed at the end: concurrent checkers read complete entries only.
+		Errors are ignored, the cache is only an optimization.
+		"""
+		import pickle # pylint: disable=import-outside-toplevel
+		import tempfile # pylint: disable=import-outside-toplevel
+		try:
+			os.makedirs(self.directory, exist_ok=True)
+			with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as fh:
+				pickle.dump(expecteds, fh, protocol=pickle.HIGHEST_PROTOCOL)
+			os.replace(fh.name, path)
+		except (OSError, pickle.PicklingError):
+			return
+		self.evict()
+
+	def evict(self):
+		"""
+		Removes the least recently used entries until the others fit in `max_bytes`.
+		"""
+		entries = list()
+		with os.scandir(self.directory) as scan:
+			for entry in scan:
+				if entry.name.endswith(self.SUFFIX):
+					try:
+						stat = entry.stat()
+					except FileNotFoundError:
+						continue
+					entries.append((stat.st_mtime, stat.st_size, entry.path))
+		size = sum(e[1] for e in entries)
+		for _, entry_size, path in sorted(entries):
+			if size <= self.max_bytes:
+				break
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				pass
+			size -= entry_size
@@ -0,0 +1,66 @@
+"""
+Profiling of the Test Checker JSON: wall time of the phases of the checks and their counters.
+"""
+
+import contextlib
+from time import perf_counter
+
+
+class Profile(object):
+	"""
+	Metrics of the checks it is given to: wall time and number of runs of each phase, and counters (Expecteds, Messages,
+	candidates, and their maximum per Expected, compared fields, candidate pairs kept, Matches retained). A Match is built
+	for each Match retained only: no counter of the Match objects is needed. The mean number of candidates per Expected
+	is the ratio of the candidates to the Expecteds.
+	The compared fields are an estimate, an upper bound of the comparator calls: the checked fields of each candidate
+	ranked, then of each candidate kept. Pruned distances, fields equal to the expected ones and numpy windows call fewer.
+	`callback(phase, seconds)`, if given, is called at the end of each phase.
+	"""
+	def __init__(self, callback=None):
+		self.callback = callback
+		self.times = dict()
+		self.calls = dict()
+		self.counters = dict()
+
+	@contextlib.contextmanager
+	def phase(self, name):
+		"""
+		Context measuring the phase `name`.
+		"""
+		start = perf_counter()
+		yield
+		self.add_time(name, perf_counter() - start)
+
+	def add_time(self, name, seconds, calls=1):
+		"""
+		Adds `calls` runs of the phase `name`, lasting `seconds` in all.
+		"""
+		self.times[name] = self.times.get(name, 0.0) + seconds
+		self.calls[name] = self.calls.get(name, 0) + calls
+		if self.callback is not None:
+			self.callback(name, seconds)
+
+	def count(self, name, number=1):
+		"""
+		Adds `number` to the counter `name`.
+		"""
+		self.counters[name] = self.counters.get(name, 0) + number
+
+	def peak(self, name, number):
+		"""
+		Raises the counter `name` to `number` if it is lower: the counter is the maximum of the numbers given.
+		"""
+		self.counters[name] = max(self.counters.get(name, 0), number)
+
+	def to_dict(self):
+		"""
+		Returns the metrics as a dict of JSON values.
+		"""
+		return {"phases": {name: {"seconds": seconds, "calls": self.calls[name]} for name, seconds in self.times.items()},
+			"counters": dict(self.counters)}
+
+	def __str__(self):
+		lines = ["{:<16}{:>10}{:>14}".format("Phase", "Calls", "Time (ms)")]
+		lines += ["{:<16}{:>10}{:>14.3f}".format(name, self.calls[name], seconds * 1000) for name, seconds in self.times.items()]
+		lines += ["{:<16}{:>10}".format(name, number) for name, number in self.counters.items()]
+		return "\n".join(lines)
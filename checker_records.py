@@ -0,0 +1,358 @@
+"""
+Records of the Test Checker JSON: JSON arrays and JSON Lines read node by node, and the columnar binary record.
+"""
+
+import array
+import contextlib
+import gc
+import json
+import mmap
+import re
+import struct
+import sys
+
+
+_WHITESPACES = re.compile(r"\s*")
+
+
+def _iter_json_array(fh, chunk_size):
+	"""
+	Generator parsing the items of the JSON array in `fh` one by one.
+	Only the unparsed tail of the file read so far is kept in memory.
+	"""
+	decoder = json.JSONDecoder()
+	buf = ""
+	pos = 0
+	eof = False
+	tokens, value_allowed = "[", False
+	while True:
+		pos = _WHITESPACES.match(buf, pos).end()
+		node, end = None, None
+		if pos < len(buf):
+			char = buf[pos]
+			if char in tokens:
+				if char == "]":
+					return
+				tokens, value_allowed = ("]" if char == "[" else ""), True
+				pos += 1
+				continue
+			if not value_allowed:
+				raise ValueError("Unexpected character {!r} in JSON array".format(char))
+			try:
+				node, end = decoder.raw_decode(buf, pos)
+			except ValueError:
+				if eof:
+					raise
+		elif eof:
+			raise ValueError("Unexpected end of JSON array")
+
+		if end is None or (end == len(buf) and not eof):
+			# The item may continue in the next chunk: read more and parse again.
+			chunk = fh.read(max(chunk_size, len(buf) - pos))
+			eof = not chunk
+			buf = buf[pos:] + chunk
+			pos = 0
+			continue
+		yield node
+		pos = end
+		tokens, value_allowed = ",]", False
+
+
+def iter_records(filename, chunk_size=1 << 16):
+	"""
+	Generator yielding the JSON nodes stored in `filename` one by one.
+	The file holds either a JSON array or JSON Lines (one node per line).
+	"""
+	with open(filename, encoding="utf-8") as fh:
+		head = fh.read(chunk_size).lstrip()
+		while not head:
+			chunk = fh.read(chunk_size)
+			if not chunk:
+				return
+			head = chunk.lstrip()
+		fh.seek(0)
+		if head[0] == "[":
+			for node in _iter_json_array(fh, chunk_size):
+				yield node
+		else:
+			for line in fh:
+				if line.strip():
+					yield json.loads(line)
+
+
+@contextlib.contextmanager
+def gc_paused():
+	"""
+	Context pausing the garbage collector, while many objects are built and none is garbage:
+	the collector would walk them many times over for nothing.
+	"""
+	collect = gc.isenabled()
+	gc.disable()
+	try:
+		yield
+	finally:
+		if collect:
+			gc.enable()
+
+
+_COLUMNAR_MAGIC = b"TCJCOL\x00\x01"
+_COLUMNAR_HEADER = struct.Struct("=8sQQ") # Magic, offset and size of the metadata
+_FLOAT, _INT, _BOOL, _NULL, _STRING, _JSON = range(6) # Kinds of the values of a column
+_DOUBLE = struct.Struct("=d")
+_INT64 = struct.Struct("=q")
+
+
+class _ColumnWriter(object):
+	"""
+	Values of a field in the rows of a table of a columnar record: a kind per row, with an 8 bytes
+	number, and the bytes of the strings and of the other JSON values delimited by offsets.
+	"""
+	def __init__(self):
+		self.kinds = array.array("B")
+		self.numbers = bytearray()
+		self.offsets = array.array("Q", [0])
+		self.blob = bytearray()
+
+	def append(self, value):
+		"""
+		Adds `value` in a new row.
+		"""
+		if isinstance(value, bool):
+			kind, number = _BOOL, _INT64.pack(value)
+		elif isinstance(value, int) and -(1 << 63) <= value < (1 << 63):
+			kind, number = _INT, _INT64.pack(value)
+		elif isinstance(value, float):
+			kind, number = _FLOAT, _DOUBLE.pack(value)
+		else:
+			number = bytes(8)
+			if value is None:
+				kind = _NULL
+			elif isinstance(value, str):
+				kind = _STRING
+				self.blob += value.encode("utf-8", "surrogatepass")
+			else:
+				kind = _JSON
+				self.blob += json.dumps(value).encode("utf-8")
+		self.kinds.append(kind)
+		self.numbers += number
+		self.offsets.append(len(self.blob))
+
+	def sections(self):
+		"""
+		Returns the bytes of the column, by section.
+		"""
+		return {"kind": self.kinds.tobytes(), "number": bytes(self.numbers), "offset": self.offsets.tobytes(), "blob": bytes(self.blob)}
+
+
+def write_columnar(nodes, filename):
+	"""
+	Writes the recorded messages `nodes` (JSON nodes) in the columnar binary record `filename` (see ColumnarRecord).
+	Messages with the same fields, in the same order, are stored in the same table, one column per field.
+	"""
+	names = dict()
+	layouts = dict()
+	tables = list()
+	rows = list() # Number of rows of each table
+	columns = {"time": array.array("d"), "name": array.array("I"), "layout": array.array("I"), "row": array.array("I")}
+	for node in nodes:
+		fields = node["message"]
+		keys = tuple(fields)
+		layout = layouts.get(keys)
+		if layout is None:
+			layout = layouts[keys] = len(tables)
+			tables.append((keys, [_ColumnWriter() for _ in keys]))
+			rows.append(0)
+		columns["time"].append(float(node["time"]))
+		columns["name"].append(names.setdefault(node["name"], len(names)))
+		columns["layout"].append(layout)
+		columns["row"].append(rows[layout])
+		rows[layout] += 1
+		for column, value in zip(tables[layout][1], fields.values()):
+			column.append(value)
+
+	with open(filename, "wb") as fh:
+		def section(data):
+			# Sections are aligned on 8 bytes, for the memoryview casts
+			fh.write(bytes(-fh.tell() % 8))
+			ref = [fh.tell(), len(data)]
+			fh.write(data)
+			return ref
+
+		fh.write(_COLUMNAR_HEADER.pack(_COLUMNAR_MAGIC, 0, 0))
+		meta = {name: section(column.tobytes()) for name, column in columns.items()}
+		meta.update(byteorder=sys.byteorder, count=len(columns["time"]), names=list(names),
+			tables=[{"keys": list(keys), "columns": [{name: section(data) for name, data in column.sections().items()} for column in table]}
+				for keys, table in tables])
+		data = json.dumps(meta).encode("utf-8")
+		offset = fh.tell()
+		fh.write(data)
+		fh.seek(0)
+		fh.write(_COLUMNAR_HEADER.pack(_COLUMNAR_MAGIC, offset, len(data)))
+
+
+def is_columnar(filename):
+	"""
+	Returns True if `filename` is a columnar binary record (see write_columnar).
+	"""
+	with open(filename, "rb") as fh:
+		return fh.read(len(_COLUMNAR_MAGIC)) == _COLUMNAR_MAGIC
+
+
+class _Sections(object):
+	"""
+	The sections of a columnar record mapped in `buffer`, listed by its metadata `meta` (see write_columnar),
+	as views of their items: the columns of the Messages, and the keys and the columns of each table,
+	a column as (kinds, floats, ints, offsets, blob).
+	"""
+	def __init__(self, buffer, meta):
+		self._views = [memoryview(buffer)]
+		self.times = self._section(meta["time"], "d")
+		self.name_ids = self._section(meta["name"], "I")
+		self.layouts = self._section(meta["layout"], "I")
+		self.rows = self._section(meta["row"], "I")
+		self.tables = [(tuple(sys.intern(key) for key in table["keys"]), [(
+			self._section(column["kind"], "B"),
+			self._section(column["number"], "d"),
+			self._section(column["number"], "q"),
+			self._section(column["offset"], "Q"),
+			self._section(column["blob"], "B")) for column in table["columns"]]) for table in meta["tables"]]
+
+	def _section(self, ref, fmt):
+		"""
+		Returns the section `ref` of the buffer, as a view of items of format `fmt`.
+		"""
+		offset, size = ref
+		view = self._views[0][offset:offset + size].cast(fmt)
+		self._views.append(view)
+		return view
+
+	def release(self):
+		"""
+		Releases the views: the buffer can be closed.
+		"""
+		for view in reversed(self._views):
+			view.release()
+		self._views = list()
+
+
+class ColumnarRecord(object):
+	"""
+	The Messages of the columnar binary record `filename` (see write_columnar), mapped in memory.
+	It is a sequence of Messages, built when first accessed by `message(name, time, fields)` (see Message.from_fields).
+	The columns `times` and `name_ids` (positions in `names`) are views of the file: the candidate windows
+	are found without building the Messages.
+	"""
+	def __init__(self, filename, message):
+		self._message = message
+		with open(filename, "rb") as fh:
+			self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, offset, size = _COLUMNAR_HEADER.unpack_from(self._mmap)
+		meta = json.loads(self._mmap[offset:offset + size]) if magic == _COLUMNAR_MAGIC else dict()
+		if meta.get("byteorder") != sys.byteorder:
+			self._mmap.close()
+			raise ValueError("{} is not a columnar record of this platform".format(filename))
+		self._sections = _Sections(self._mmap, meta)
+		self.names = [sys.intern(name) for name in meta["names"]]
+		self._decoded = [None] * len(self._sections.tables)
+		self._messages = [None] * meta["count"]
+
+	@property
+	def times(self):
+		"""
+		The times of the Messages, a view of the file.
+		"""
+		return self._sections.times
+
+	@property
+	def name_ids(self):
+		"""
+		The positions in `names` of the names of the Messages, a view of the file.
+		"""
+		return self._sections.name_ids
+
+	@staticmethod
+	def _column_values(column):
+		"""
+		Returns the list of the values of `column`, decoded at once when they are all of the same kind.
+		"""
+		kinds, floats, ints, offsets, blob = column
+		count = len(kinds)
+		kind = kinds[0] if count else _NULL
+		if kinds.tobytes().count(kind) == count:
+			if kind == _FLOAT:
+				return floats.tolist()
+			if kind in (_INT, _BOOL):
+				return ints.tolist() if kind == _INT else [number != 0 for number in ints.tolist()]
+			if kind == _NULL:
+				return [None] * count
+			if kind == _JSON:
+				return json.loads(b"[" + b",".join(blob[start:end] for start, end in zip(offsets, offsets[1:])) + b"]")
+			text = str(blob, "utf-8", "surrogatepass")
+			if len(text) == len(blob): # ASCII: the offsets of the bytes are those of the characters
+				bounds = offsets.tolist()
+				return [text[start:end] for start, end in zip(bounds, bounds[1:])]
+		values = list()
+		for row, kind in enumerate(kinds):
+			if kind == _FLOAT:
+				values.append(floats[row])
+			elif kind == _INT:
+				values.append(ints[row])
+			elif kind == _BOOL:
+				values.append(ints[row] != 0)
+			elif kind == _NULL:
+				values.append(None)
+			elif kind == _STRING:
+				values.append(str(blob[offsets[row]:offsets[row + 1]], "utf-8", "surrogatepass"))
+			else:
+				values.append(json.loads(bytes(blob[offsets[row]:offsets[row + 1]])))
+		return values
+
+	def _table(self, layout):
+		"""
+		Returns the keys of the table `layout` and the list of the values of its rows, decoded on the first call.
+		"""
+		table = self._decoded[layout]
+		if table is None:
+			keys, columns = self._sections.tables[layout]
+			with gc_paused():
+				table = self._decoded[layout] = (keys, list(zip(*(self._column_values(column) for column in columns))))
+		return table
+
+	def __len__(self):
+		return len(self._messages)
+
+	def __getitem__(self, pos):
+		msg = self._messages[pos]
+		if msg is None:
+			# Built without a JSON node: the name and the keys are already interned.
+			sections = self._sections
+			keys, rows = self._table(sections.layouts[pos])
+			fields = dict(zip(keys, rows[sections.rows[pos]])) if keys else dict()
+			msg = self._messages[pos] = self._message(self.names[sections.name_ids[pos]], sections.times[pos], fields)
+		return msg
+
+	def __iter__(self):
+		for pos in range(len(self._messages)):
+			yield self[pos]
+
+	def groups(self):
+		"""
+		Returns the positions of the Messages, grouped by name.
+		"""
+		groups = [list() for _ in self.names]
+		for pos, name_id in enumerate(self.name_ids):
+			groups[name_id].append(pos)
+		return dict(zip(self.names, groups))
+
+	def close(self):
+		"""
+		Releases the views of the file and unmaps it. The Messages already built remain valid.
+		"""
+		self._sections.release()
+		self._mmap.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
@@ -0,0 +1,210 @@
+"""
+Reports of the Test Checker JSON: sinks writing the Matches of a check one by one.
+"""
+
+import functools
+import json
+import math
+import os
+import sys
+
+
+_XML_STATUS = {"OK": "MESSAGE MATCHED", # By name of the Status of a Match
+	"MATCH_NOT_FOUND": "EXPECTED WITHOUT MESSAGE",
+	"MATCH_ERROR": "MESSAGE NOT MATCHED",
+	"NO_EXPECTED": "MESSAGE UNCHECKED"}
+_XML_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+_XML_MESSAGE = """
+	<Message>
+		<Status>{}</Status>
+		<Name>{}</Name>
+		<Interface>JSON</Interface>
+		<From>{}</From>
+		<To>{}</To>
+	</Message>"""
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _xml_second(second):
+	"""
+	Returns the time of day of the timestamp `second`, to the second.
+	Results are memoized: the Matches of a run share few distinct seconds.
+	"""
+	import datetime # pylint: disable=import-outside-toplevel
+	return datetime.datetime.fromtimestamp(second).strftime('%H:%M:%S')
+
+
+def _xml_time(time):
+	"""
+	Returns the time of day of `time` (in ms), as written in the xml report:
+	the same as datetime.fromtimestamp(time/1000).strftime('%H:%M:%S.%f'), microseconds rounded half to even.
+	"""
+	fraction, second = math.modf(time/1000)
+	micro = round(fraction * 1e6)
+	if micro >= 1000000:
+		micro -= 1000000
+		second += 1
+	elif micro < 0:
+		micro += 1000000
+		second -= 1
+	return "{}.{:06d}".format(_xml_second(second), micro)
+
+
+def xml_message(match):
+	"""
+	Returns the XML Node of `match`.
+	"""
+	name = match.expected.name if match.expected else match.msg.name
+	time_from = match.expected.time if match.expected else match.msg.time
+	time_to = time_from + match.expected.tolerance if match.expected else 0
+	return _XML_MESSAGE.format(_XML_STATUS[match.status().name], str(name).translate(_XML_ESCAPES), _xml_time(time_from), _xml_time(time_to))
+
+
+class XmlReport(object):
+	"""
+	Writes the Matches given one by one in the xml report `filename`.
+	Nodes are written by chunks of `chunk_size` Matches. The report is complete once closed.
+	"""
+	def __init__(self, filename, chunk_size=1024):
+		self._fh = open(filename, 'w', encoding="utf-8") # pylint: disable=consider-using-with # Closed by close()
+		self._fh.write('<?xml version="1.0" encoding="utf-8"?>\n')
+		self._fh.write("<Check>")
+		self._pending = list()
+		self.chunk_size = chunk_size
+
+	def write(self, match):
+		"""
+		Adds `match` to the report.
+		"""
+		self._pending.append(xml_message(match))
+		if len(self._pending) >= self.chunk_size:
+			self.flush()
+
+	def flush(self):
+		"""
+		Writes the pending nodes in the file.
+		"""
+		self._fh.write("".join(self._pending))
+		self._pending = list()
+
+	def close(self):
+		"""
+		Writes the end of the report and closes the file.
+		"""
+		if not self._fh.closed:
+			self.flush()
+			self._fh.write("</Check>\n")
+			self._fh.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+class JsonLinesReport(object):
+	"""
+	Writes the Matches given one by one in `filename`, one JSON record per line (see Match.to_record).
+	The file is compressed with gzip if `filename` ends with ".gz". If `append`, records are added
+	after those of the previous runs. Records are written by chunks of `chunk_size` Matches.
+	"""
+	def __init__(self, filename, append=False, chunk_size=1024):
+		mode = "at" if append else "wt"
+		if filename.endswith(".gz"):
+			import gzip # pylint: disable=import-outside-toplevel
+			self._fh = gzip.open(filename, mode, compresslevel=1, encoding="utf-8")
+		else:
+			self._fh = open(filename, mode, encoding="utf-8") # pylint: disable=consider-using-with # Closed by close()
+		self._encode = json.JSONEncoder(separators=(",", ":")).encode
+		self._pending = list()
+		self.chunk_size = chunk_size
+
+	def write(self, match):
+		"""
+		Adds `match` to the report.
+		"""
+		self._pending.append(self._encode(match.to_record()))
+		if len(self._pending) >= self.chunk_size:
+			self.flush()
+
+	def flush(self):
+		"""
+		Writes the pending records in the file.
+		"""
+		if self._pending:
+			self._fh.write("\n".join(self._pending) + "\n")
+			self._pending = list()
+
+	def close(self):
+		"""
+		Writes the pending records and closes the file.
+		"""
+		if not self._fh.closed:
+			self.flush()
+			self._fh.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+class VerboseReport(object):
+	"""
+	Renders the Matches given one by one in `stream` (the standard output if None), as the verbose mode prints them.
+	Only the failing Matches are rendered, unless `failures_only` is False. At most `max_matches` Matches
+	are rendered, with at most `max_fields` fields each (all if None).
+	Each Match is written and flushed as soon as it is rendered: the output can be piped to a pager,
+	and closing the pager only stops the rendering.
+	"""
+	def __init__(self, stream=None, failures_only=True, max_matches=None, max_fields=None):
+		self.stream = stream
+		self.failures_only = failures_only
+		self.max_matches = max_matches
+		self.max_fields = max_fields
+		self.rendered = 0
+		self.skipped = 0
+		self._broken = False
+
+	def write(self, match):
+		"""
+		Renders `match` if it is shown.
+		"""
+		if self.failures_only and match.score in (0, -1):
+			return
+		if self.max_matches is not None and self.rendered >= self.max_matches:
+			self.skipped += 1
+			return
+		self.rendered += 1
+		self._print(match.render(self.max_fields), "\n")
+
+	def _print(self, *text):
+		"""
+		Writes `text` in the stream, if it is still open.
+		"""
+		if self._broken:
+			return
+		stream = sys.stdout if self.stream is None else self.stream
+		try:
+			print(*text, file=stream, flush=True)
+		except BrokenPipeError:
+			self._broken = True
+			if stream is sys.stdout:
+				# The flush of the standard output at exit would fail again.
+				os.dup2(os.open(os.devnull, os.O_WRONLY), stream.fileno())
+
+	def close(self):
+		"""
+		Writes the number of Matches not rendered because of `max_matches`.
+		"""
+		if self.skipped:
+			self._print("({} more matches not shown)".format(self.skipped))
+			self.skipped = 0
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
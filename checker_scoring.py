@@ -0,0 +1,374 @@
+"""
+Scoring of the Messages by the Test Checker JSON: comparators of the field values, and the matchers
+of the checked fields of the Expecteds, over numpy for the numeric windows.
+"""
+
+import enum
+import functools
+import json
+import re
+import string
+import weakref
+
+
+class _CharRanks(dict):
+	"""
+	Maps a character to its position in string.printable.
+	Other characters rank after the printable ones, by code point.
+	"""
+	def __missing__(self, char):
+		rank = len(string.printable) + ord(char)
+		self[char] = rank
+		return rank
+
+
+_CHAR_RANKS = _CharRanks((char, pos) for pos, char in enumerate(string.printable))
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _str_distance(a, b):
+	"""
+	Returns the sum of difference between ranks of the letters of strings `a` and `b`,
+	plus the difference of their lengths.
+	Results are memoized: messages often repeat the same payload.
+	"""
+	ranks = _CHAR_RANKS
+	diff = abs(len(a) - len(b))
+	for chr1, chr2 in zip(a, b):
+		if chr1 != chr2:
+			diff += abs(ranks[chr1] - ranks[chr2])
+	return diff
+
+
+def score_cache_info():
+	"""
+	Returns the statistics (hits, misses, maxsize, currsize) of the memo of string distances.
+	"""
+	return _str_distance.cache_info() # pylint: disable=no-value-for-parameter
+
+
+_DIGITS = r"\d(?:_?\d)*"
+_NUMBER = re.compile(r"\s*[+-]?(?:(?:{0}(?:\.(?:{0})?)?|\.{0})(?:[eE][+-]?{0})?|inf(?:inity)?|nan)\s*".format(_DIGITS), re.IGNORECASE)
+
+
+def _as_number(value):
+	"""
+	Returns `value` as a float, or None if `value` is a string that float() does not accept.
+	"""
+	if isinstance(value, str) and not _NUMBER.fullmatch(value):
+		return None
+	return float(value)
+
+
+class _Kind(enum.Enum):
+	"""
+	Kind of a JSON value, used to select a comparator
+	"""
+	NUMBER = 0
+	STRING = 1
+	LIST = 2
+	DICT = 3
+	BOOL = 4
+	NULL = 5
+
+
+_KIND_OF_TYPE = {int: _Kind.NUMBER, float: _Kind.NUMBER, str: _Kind.STRING, list: _Kind.LIST,
+	dict: _Kind.DICT, bool: _Kind.BOOL, type(None): _Kind.NULL}
+
+
+def _kind(value):
+	"""
+	Returns the _Kind of `value`. Values without a float conversion are handled as NULL.
+	"""
+	kind = _KIND_OF_TYPE.get(type(value))
+	if kind is not None:
+		return kind
+	for cls, kind in ((str, _Kind.STRING), (list, _Kind.LIST), (dict, _Kind.DICT), (int, _Kind.NUMBER), (float, _Kind.NUMBER)):
+		if isinstance(value, cls):
+			return kind
+	return _Kind.NULL
+
+
+def _sub_numbers(a, b):
+	"""
+	Comparator of two numbers (or booleans).
+	"""
+	return float(a) - float(b)
+
+
+def _sub_scalars(a, b):
+	"""
+	Comparator of a string with a number or a string: substraction if both are numbers, distance of the letters otherwise.
+	"""
+	num_a = _as_number(a)
+	num_b = _as_number(b)
+	if num_a is None or num_b is None:
+		return _str_distance(str(a), str(b))
+	return num_a - num_b
+
+
+def _sub_sequences(a, b):
+	"""
+	Comparator of a list, a dict or null with any value. Values other than lists are compared as strings.
+	Returns 1 if one is a list and not the other, plus the difference of their lengths,
+	plus the distance of their items.
+	"""
+	_a = a if isinstance(a, list) else str(a)
+	_b = b if isinstance(b, list) else str(b)
+	diff = 0 if isinstance(_a, type(_b)) else 1
+	diff += abs(len(_a) - len(_b))
+	for val1, val2 in zip(_a, _b):
+		diff += abs(fuzzy_sub(val1, val2))
+	return diff
+
+
+def _sub_str_sequence(a, b):
+	"""
+	Comparator of a string with a list, a dict or null.
+	"""
+	if _as_number(a) is None:
+		return _str_distance(a, str(b))
+	return _sub_sequences(a, b)
+
+
+def _comparator(kind_a, kind_b):
+	"""
+	Returns the comparator of a value of `kind_a` with a value of `kind_b`.
+	"""
+	numbers = (_Kind.NUMBER, _Kind.BOOL)
+	sequences = (_Kind.LIST, _Kind.DICT, _Kind.NULL)
+	if kind_a in sequences or (kind_a in numbers and kind_b in sequences):
+		return _sub_sequences
+	if kind_b in sequences:
+		return _sub_str_sequence
+	if kind_a in numbers and kind_b in numbers:
+		return _sub_numbers
+	return _sub_scalars
+
+
+_COMPARATORS = {(kind_a, kind_b): _comparator(kind_a, kind_b) for kind_a in _Kind for kind_b in _Kind}
+
+
+def fuzzy_sub(a, b):
+	"""
+	Returns the difference between a and b. Substraction for number.
+	For strings: it returns the sum of difference between positions of the letters.
+	"""
+	return _COMPARATORS[(_kind(a), _kind(b))](a, b)
+
+
+class _ComparatorTable(dict):
+	"""
+	Maps the type of a value to its comparator with a value of a given kind.
+	Unknown types fall back on fuzzy_sub.
+	"""
+	def __missing__(self, key):
+		return fuzzy_sub
+
+
+@functools.lru_cache(maxsize=None)
+def _comparator_tables(kind):
+	"""
+	Returns the `_ComparatorTable` of a value of `kind` with the values of a Message, and the reverse one.
+	Tables are shared by the fields of the same kind.
+	"""
+	return (_ComparatorTable((cls, _COMPARATORS[(kind, msg_kind)]) for cls, msg_kind in _KIND_OF_TYPE.items()),
+		_ComparatorTable((cls, _COMPARATORS[(msg_kind, kind)]) for cls, msg_kind in _KIND_OF_TYPE.items()))
+
+
+class _FieldComparator(object):
+	"""
+	Comparators of a checked field of an Expected, resolved from the kind of its value.
+	"""
+	def __init__(self, value):
+		kind = _kind(value)
+		self.value = value
+		self.to_message, self.from_message = _comparator_tables(kind)
+		number = _as_number(value) if kind in (_Kind.NUMBER, _Kind.BOOL, _Kind.STRING) else None
+		# Values other than numbers are compared by distances, never negative.
+		self.nonnegative = number is None
+		if number is not None:
+			self.missing = abs(number)
+		elif kind == _Kind.NULL:
+			self.missing = 1
+		else:
+			self.missing = len(value) + 1
+
+
+class _Matcher(object):
+	"""
+	The checked fields of an Expected compiled into a scoring function for the fields of a Message.
+	Expecteds with identical checked fields share a `_Matcher` (see `shared_matcher`).
+	"""
+	def __init__(self, fields):
+		comparators = [_FieldComparator(v) for v in fields.values()]
+		self.keys = tuple(fields)
+		self.values = tuple(fields.values())
+		self._checks = tuple((k, cmp.value, cmp.missing, cmp.from_message) for k, cmp in zip(self.keys, comparators))
+		self._weighted = tuple((cmp.value, cmp.to_message, 10 ** (3 - pos)) for pos, cmp in enumerate(comparators))
+		self._rest_nonnegative = tuple(all(cmp.nonnegative for cmp in comparators[pos + 1:]) for pos in range(len(comparators)))
+		self.numeric = all(_is_numeric(v) for v in self.values)
+
+	def score(self, fields):
+		"""
+		Returns the sum of the differences between the checked fields and the same fields in `fields`.
+		A missing field counts for the size of the expected value.
+		"""
+		score = 0
+		for key, value, missing, from_message in self._checks:
+			other = fields.get(key, MISSING)
+			if other is MISSING:
+				score += missing
+			elif other != value:
+				score += from_message[type(other)](other, value)
+		return score
+
+	def distance(self, fields, bound=None):
+		"""
+		Returns the distance used to rank candidate Messages: the differences between
+		the checked fields and the values of `fields`, paired by position and weighted by it.
+		If `bound` is given, returns None as soon as the absolute distance is known to exceed `bound`:
+		when the partial sum does and only distances (never negative) remain to be added.
+		"""
+		if bound is None:
+			return sum(to_message[type(other)](value, other) * weight for (value, to_message, weight), other in zip(self._weighted, fields.values()))
+		terms = list()
+		partial = 0
+		for (value, to_message, weight), other, rest_nonnegative in zip(self._weighted, fields.values(), self._rest_nonnegative):
+			term = to_message[type(other)](value, other) * weight
+			terms.append(term)
+			partial += term
+			if rest_nonnegative and partial > bound:
+				return None
+		return sum(terms)
+
+
+MISSING = object() # Value of a field missing in a Message
+_MATCHERS = weakref.WeakValueDictionary()
+
+
+def shared_matcher(fields):
+	"""
+	Returns the `_Matcher` of the checked `fields`, shared with the Expecteds checking the same fields.
+	"""
+	try:
+		spec = json.dumps(list(fields.items()))
+	except (TypeError, ValueError):
+		return _Matcher(fields)
+	matcher = _MATCHERS.get(spec)
+	if matcher is None:
+		matcher = _Matcher(fields)
+		_MATCHERS[spec] = matcher
+	return matcher
+
+
+_NUMERIC_TYPES = (int, float, bool)
+NUMERIC_WINDOW = 32 # Smallest candidate window scored with numpy
+
+
+def _is_numeric(value):
+	"""
+	Returns True if `value` is a number or a list of numbers.
+	"""
+	if isinstance(value, list):
+		return all(type(item) in _NUMERIC_TYPES for item in value)
+	return type(value) in _NUMERIC_TYPES
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy():
+	"""
+	Returns the numpy module, or None if it is not installed.
+	"""
+	try:
+		import numpy # pylint: disable=import-outside-toplevel
+	except ImportError:
+		return None
+	return numpy
+
+
+def _as_floats(values):
+	"""
+	Returns the numbers of `values` as floats, 0 for the missing ones.
+	Raises TypeError if a value is not a number.
+	"""
+	floats = list()
+	for value in values:
+		if value is MISSING:
+			floats.append(0.0)
+		elif type(value) in _NUMERIC_TYPES:
+			floats.append(float(value))
+		else:
+			raise TypeError(value)
+	return floats
+
+
+def _numeric_diffs(numpy, value, column):
+	"""
+	Returns the differences between the expected `value` and the values of `column` (lists of numbers
+	if `value` is a list, numbers otherwise) as an array, and the mask of the values equal to `value`.
+	"""
+	if not isinstance(value, list):
+		others = numpy.array(_as_floats(column))
+		return float(value) - others, others == float(value)
+	width = len(value)
+	lengths = numpy.zeros(len(column))
+	items = numpy.zeros((len(column), width))
+	present = numpy.zeros((len(column), width), dtype=bool)
+	for row, other in enumerate(column):
+		if other is MISSING:
+			continue
+		if not isinstance(other, list):
+			raise TypeError(other)
+		head = _as_floats(other[:width])
+		lengths[row] = len(other)
+		items[row, :len(head)] = head
+		present[row, :len(head)] = True
+	diffs = numpy.abs(lengths - width)
+	equal = lengths == width
+	for pos, item in enumerate(value):
+		diffs += numpy.where(present[:, pos], numpy.abs(float(item) - items[:, pos]), 0.0)
+		equal &= items[:, pos] == float(item)
+	return diffs, equal
+
+
+def numeric_window(matcher, messages):
+	"""
+	Returns the distances (see `_Matcher.distance`) and the scores (see `_Matcher.score`) of `messages`
+	computed with numpy, field by field over the whole window.
+	Returns None if numpy is not installed or if a compared value of a Message is not numeric like the expected one.
+	"""
+	numpy = _numpy()
+	if numpy is None:
+		return None
+	fields = [msg._fields for msg in messages]
+	distances = numpy.zeros(len(fields))
+	scores = numpy.zeros(len(fields))
+	try:
+		with numpy.errstate(invalid="ignore", over="ignore"):
+			_numeric_fields(numpy, matcher, fields, distances, scores)
+	except (TypeError, OverflowError):
+		return None
+	return distances.tolist(), scores.tolist()
+
+
+def _numeric_fields(numpy, matcher, fields, distances, scores):
+	"""
+	Step of `numeric_window`: adds the terms of each checked field to the `distances` and the `scores`.
+	"""
+	positional = [tuple(f.values()) for f in fields]
+	for pos, (key, value) in enumerate(zip(matcher.keys, matcher.values)):
+		column = [f.get(key, MISSING) for f in fields]
+		missing = numpy.array([other is MISSING for other in column])
+		diffs, equal = _numeric_diffs(numpy, value, column)
+		if not isinstance(value, list):
+			absent = abs(float(value))
+			diffs = -diffs
+		else:
+			absent = len(value) + 1
+		scores += numpy.where(missing, absent, numpy.where(equal, 0.0, diffs))
+
+		column = [other[pos] if pos < len(other) else MISSING for other in positional]
+		missing = numpy.array([other is MISSING for other in column])
+		diffs, _ = _numeric_diffs(numpy, value, column)
+		distances += numpy.where(missing, 0.0, diffs * (10 ** (3 - pos)))
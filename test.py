@@ -1,13 +1,26 @@
+import bench_checker
+import checker_assignment
+import checker_batch
+import checker_cache
+import checker_records
+import checker_scoring
 import copy
+import datetime
+import gzip
 import inspect
+import io
 import json
 import os
 import re
+import subprocess
+import sys
+import tempfile
 import test_checker
 import unittest
+import unittest.mock
 
 from pylint import epylint as lint
-from test_checker import Expected, Message, Status
+from test_checker import Expected, IncrementalChecker, Message, Options, Status
 
 
 class TestBasics(unittest.TestCase):
@@ -385,25 +398,628 @@ class TestBasics(unittest.TestCase):
 			"time": 27000})]
 		self.check_test(expected, output, [Status.MATCH_ERROR], -1)
 
+	def test_028_unsorted_outputs_with_other_names(self):
+		expected = [Expected({"message": {"Field_1": 1, "Field_2": 2, "Field_3": 3.4},
+			"name": "msg_1",
+			"time": 28000,
+			"checkMode": "one",
+			"fieldsToCheck": ["Field_1"],
+			"tolerance": "100"})]
+		output = [Message({"message": {"Field_1": 1, "Field_2": 2, "Field_3": 3.4},
+			"name": "msg_1",
+			"time": 28100}),
+			Message({"message": {"Field_1": 1, "Field_2": 2, "Field_3": 3.4},
+			"name": "msg_2",
+			"time": 28000}),
+			Message({"message": {"Field_1": 1, "Field_2": 2, "Field_3": 3.4},
+			"name": "msg_1",
+			"time": 27899})]
+		self.check_test(expected, output, [Status.NO_EXPECTED, Status.NO_EXPECTED, Status.OK], 0)
+		self.assertEqual([r.msg.name for r in self.chk.retained], ["msg_1", "msg_2", "msg_1"])
+
+	def test_029_inputs_left_untouched(self):
+		expected = [Expected({"message": {"Field_1": 1, "Field_2": 2, "Field_3": 3.4},
+			"name": "msg_1",
+			"time": 29000,
+			"checkMode": "one",
+			"fieldsToCheck": ["Field_1"],
+			"tolerance": "100"})]
+		output = [Message({"message": {"Field_1": 1, "Field_2": 2, "Field_3": 3.4},
+			"name": "msg_1",
+			"time": 29000})]
+		self.check_test(list(expected), list(output), [Status.OK], 0, combin=False)
+		self.check_test(expected, output, [Status.OK], 0)
+		self.assertEqual(len(expected), 1)
+		self.assertEqual(len(output), 1)
+
+	def test_030_message_with_non_ascii_str(self):
+		expected = [Expected({"message": {"Field_1": "Café", "Field_2": 2, "Field_3": 3.4},
+			"name": "msg_1",
+			"time": 30000,
+			"checkMode": "one",
+			"fieldsToCheck": ["Field_1"],
+			"tolerance": "100"})]
+		output = [Message({"message": {"Field_1": "Cafe", "Field_2": 2, "Field_3": 3.4},
+			"name": "msg_1",
+			"time": 30000})]
+		self.check_test(expected, output, [Status.MATCH_ERROR], -1)
+
+	def test_031_expecteds_share_matcher(self):
+		node = {"message": {"Field_1": [1, 2], "Field_2": 2, "Field_3": 3.4},
+			"name": "msg_1",
+			"time": 31000,
+			"checkMode": "one",
+			"fieldsToCheck": ["Field_1", "Field_2"],
+			"tolerance": "100"}
+		first = Expected(node)
+		self.assertIs(Expected(dict(node, time=31500)).matcher, first.matcher)
+		self.assertIsNot(Expected(dict(node, fieldsToCheck=["Field_1"])).matcher, first.matcher)
+		self.assertIsNot(Expected(dict(node, message={"Field_1": [1, 2], "Field_2": 2.0})).matcher, first.matcher)
+
+	def test_032_optimal_assignment(self):
+		expected = [Expected({"message": {"Field_1": 1},
+			"name": "msg_1",
+			"time": 32000,
+			"checkMode": "one",
+			"fieldsToCheck": ["Field_1"],
+			"tolerance": "100"}),
+			Expected({"message": {"Field_1": 1},
+			"name": "msg_1",
+			"time": 31900,
+			"checkMode": "one",
+			"fieldsToCheck": ["Field_1"],
+			"tolerance": "100"})]
+		output = [Message({"message": {"Field_1": 1},
+			"name": "msg_1",
+			"time": 31950}),
+			Message({"message": {"Field_1": 1},
+			"name": "msg_1",
+			"time": 32050})]
+		self.check_test(expected, output, [Status.MATCH_NOT_FOUND, Status.OK, Status.NO_EXPECTED], -1, combin=False)
+		self.chk = test_checker.Checker(Options(assignment=test_checker.Assignment.OPTIMAL))
+		self.check_test(expected, output, [Status.OK, Status.OK], 0, combin=False)
+
+	def test_033_compact_message(self):
+		node = json.loads('{"message": {"Field_1": 1, "Field_2": [2]}, "name": "msg_1", "time": "33000"}')
+		msg = Message(node)
+		self.assertFalse(hasattr(msg, "__dict__"))
+		self.assertIs(msg.name, sys.intern("msg_1"))
+		self.assertEqual(msg.time, 33000.0)
+		self.assertEqual([k is sys.intern(k) for k in msg._fields], [True, True])
+		node["message"]["Field_1"] = 2
+		self.assertEqual(msg._fields, {"Field_1": 1, "Field_2": [2]})
+
+	def test_034_xml_report(self):
+		expected = [Expected({"message": {"Field_1": 1},
+			"name": "msg_<1>&2",
+			"time": 34000.5,
+			"checkMode": "one",
+			"fieldsToCheck": ["Field_1"],
+			"tolerance": "100"})]
+		output = [Message({"message": {"Field_1": 2},
+			"name": "msg_<1>&2",
+			"time": 34050})]
+		self.check_test(expected, output, [Status.MATCH_ERROR], -1, combin=False)
+		with open("./foobar.xml") as fh:
+			report = fh.read()
+		self.assertEqual(report, '<?xml version="1.0" encoding="utf-8"?>\n<Check>' + """
+	<Message>
+		<Status>MESSAGE NOT MATCHED</Status>
+		<Name>msg_&lt;1&gt;&amp;2</Name>
+		<Interface>JSON</Interface>
+		<From>{}</From>
+		<To>{}</To>
+	</Message></Check>\n""".format(*(datetime.datetime.fromtimestamp(t).strftime('%H:%M:%S.%f') for t in (34.0005, 34.1005))))
+
+	def test_035_max_candidates(self):
+		expected = [Expected({"message": {"Field_1": "abc", "Field_2": [1, 2]},
+			"name": "msg_1",
+			"time": 35000,
+			"checkMode": mode,
+			"fieldsToCheck": ["Field_1", "Field_2"],
+			"tolerance": "100"}) for mode in ("one", "not")]
+		output = [Message({"message": {"Field_1": value, "Field_2": [1, 2]},
+			"name": "msg_1",
+			"time": time}) for time, value in ((34950, "abd"), (35000, "abc"), (35050, "xyz"), (35060, "abb"))]
+		ranked = test_checker._candidates(expected, output)
+		self.assertEqual([m.msg.time for m in ranked[0]], [35000, 34950, 35060, 35050])
+		self.assertEqual([m.msg.time for m in ranked[1]], [35000])
+		capped = test_checker._candidates(expected, output, max_candidates=2)
+		self.assertEqual([[(m.msg, m.score) for m in matches] for matches in capped], [[(m.msg, m.score) for m in matches[:2]] for matches in ranked])
+		self.chk = test_checker.Checker(Options(max_candidates=1))
+		self.check_test(expected[:1], output, [Status.NO_EXPECTED, Status.OK, Status.NO_EXPECTED, Status.NO_EXPECTED], 0, combin=False)
+
+	def test_036_expected_without_candidate_between_candidates(self):
+		expected = [Expected({"message": {"Field_1": value},
+			"name": "msg_1",
+			"time": time,
+			"checkMode": "one",
+			"fieldsToCheck": ["Field_1"],
+			"tolerance": "100"}) for time, value in ((36400, "a"), (36500, "b"), (36800, "d"), (36300, "b"))]
+		output = [Message({"message": {"Field_1": "d"},
+			"name": "msg_1",
+			"time": time}) for time in (36300, 36800)]
+		# The Match of the Expected at 36500, without candidate, must not be ranked among the candidate Matches:
+		# the message at 36300 is closer to the Expected at 36300 ("b") than to the one at 36400 ("a").
+		self.check_test(expected, output, [Status.MATCH_ERROR, Status.MATCH_NOT_FOUND, Status.MATCH_NOT_FOUND, Status.OK], -1)
+		self.assertEqual([(r.msg and r.msg.time, r.expected.time, r.score) for r in self.chk.retained],
+			[(36300, 36300, 2), (None, 36400, -2), (None, 36500, -2), (36800, 36800, 0)])
+
+	def test_037_candidate_table_order(self):
+		expected = [Expected({"message": {"Field_1": 1},
+			"name": "msg_1",
+			"time": 37000,
+			"checkMode": "one",
+			"fieldsToCheck": ["Field_1"],
+			"tolerance": "100"}) for _ in range(3)]
+		output = [Message({"message": {"Field_1": 1},
+			"name": "msg_1",
+			"time": time}) for time in (37010, 37005, 37010)]
+		pairs = [[(0, 1), (1, 1)], [(2, 1), (0, 0)], [(1, 1)]]
+		table = test_checker._CandidateTable(expected, output, pairs)
+		# By score, then by time of the Message, then in input order.
+		self.assertEqual(table.greedy_order(), [3, 1, 4, 0, 2])
+		matches = [table.match(pair) for pair in range(len(table))]
+		self.assertEqual([matches.index(m) for m in sorted(matches)], table.greedy_order())
+
+	def test_038_optimal_assignment_tied_scores(self):
+		# Identical periodic messages: every candidate pair has the same score.
+		count, window = 400, 5
+		expecteds, messages = list(), list()
+		for exp in range(count):
+			for msg in range(max(0, exp - window), min(count, exp + window + 1)):
+				expecteds.append(exp)
+				messages.append(msg)
+		rows = dict()
+		for pair, exp in enumerate(expecteds):
+			rows.setdefault(exp, list()).append(pair)
+		assignment = checker_assignment._Assignment(messages, [0.0] * len(messages))
+		for exp in range(count):
+			assignment.add(exp, rows[exp])
+		self.assertEqual(sorted(mate[0] for col, mate in assignment.mates.items() if col >= 0), list(range(count)))
+		# The search of each Expected stays in its window.
+		self.assertLessEqual(assignment.visited, count * (window + 1))
+		self.assertEqual(len(checker_assignment.optimal_order(expecteds, messages, [0] * len(messages), list(range(count)))), count)
+
 	def test_999_combinatorics(self):
 		self.check_test(TestBasics.COMBINATORIAL_EXPECTEDS, TestBasics.COMBINATORIAL_OUTPUTS, TestBasics.COMBINATORIAL_RESULTS, -1, combin=False)
 
 
+class TestFuzzySub(unittest.TestCase):
+	def test_printable(self):
+		self.assertEqual(test_checker.fuzzy_sub("Booh", "Bah"), 1 + abs(24 - 10) + abs(24 - 17))
+		self.assertEqual(test_checker.fuzzy_sub(["a", 1], ["c", 3]), 4)
+		self.assertEqual(test_checker.fuzzy_sub(12, "10"), 2)
+
+	def test_types(self):
+		self.assertEqual(test_checker.fuzzy_sub(" 1_0 ", 2), 8)
+		self.assertEqual(test_checker.fuzzy_sub(True, "1e0"), 0)
+		self.assertEqual(test_checker.fuzzy_sub([1, 2], "12"), 1)
+		self.assertGreater(test_checker.fuzzy_sub(None, [[1], None]), 0)
+		self.assertEqual(test_checker.fuzzy_sub({}, {}), 0)
+
+	def test_memo(self):
+		before = test_checker.score_cache_info()
+		self.assertEqual(test_checker.fuzzy_sub("heartbeat #1", "heartbeat #2"), 1)
+		self.assertEqual(test_checker.fuzzy_sub("heartbeat #1", "heartbeat #2"), 1)
+		after = test_checker.score_cache_info()
+		self.assertGreaterEqual(after.hits, before.hits + 1)
+		self.assertLessEqual(after.currsize, after.maxsize)
+
+	def test_non_printable(self):
+		self.assertEqual(test_checker.fuzzy_sub("é", "é"), 0)
+		self.assertEqual(test_checker.fuzzy_sub("é", "è"), 1)
+		self.assertGreater(test_checker.fuzzy_sub("é", "e"), 0)
+
+
+	@unittest.skipIf(checker_scoring._numpy() is None, "numpy is not installed")
+	def test_numeric_window(self):
+		matcher = checker_scoring.shared_matcher({"Field_1": 1.5, "Field_2": [1, 2, 3], "Field_3": True})
+		self.assertTrue(matcher.numeric)
+		fields = [{"Field_1": 1.5, "Field_2": [1, 2, 3], "Field_3": True},
+			{"Field_1": -2, "Field_2": [1, 2], "Field_3": 0},
+			{"Field_1": 4, "Field_2": [3, 2, 1, 0], "Field_3": 1, "Field_4": "x"},
+			{"Field_1": 0},
+			{"Field_1": float("inf"), "Field_2": [1, 2, 3, 4]}]
+		messages = [Message({"message": f, "name": "msg_1", "time": 0}) for f in fields]
+		distances, scores = checker_scoring.numeric_window(matcher, messages)
+		self.assertEqual(distances, [matcher.distance(f) for f in fields])
+		self.assertEqual(scores, [matcher.score(f) for f in fields])
+		messages.append(Message({"message": {"Field_2": [1, 2, 3], "Field_1": 1.5}, "name": "msg_1", "time": 0}))
+		self.assertIsNone(checker_scoring.numeric_window(matcher, messages))
+
+class TestIncremental(unittest.TestCase):
+	@staticmethod
+	def expected(time, field=1, tolerance="100", check_mode="one"):
+		return Expected({"message": {"Field_1": field, "Field_2": 2},
+			"name": "msg_1",
+			"time": time,
+			"checkMode": check_mode,
+			"fieldsToCheck": ["Field_1"],
+			"tolerance": tolerance})
+
+	@staticmethod
+	def message(time, field=1, name="msg_1"):
+		return Message({"message": {"Field_1": field, "Field_2": 2}, "name": name, "time": time})
+
+	def test_matches_emitted_when_window_closes(self):
+		chk = IncrementalChecker([self.expected(1000), self.expected(5000, check_mode="not")])
+		self.assertEqual(chk.feed(self.message(950)), [])
+		self.assertEqual([m.status() for m in chk.feed(self.message(1050, name="msg_2"))], [Status.NO_EXPECTED])
+		matches = chk.feed(self.message(3000, field=7))
+		self.assertEqual([m.status() for m in matches], [Status.OK, Status.NO_EXPECTED])
+		self.assertEqual(matches[0].msg.time, 950)
+		self.assertEqual([m.status() for m in chk.close()], [Status.OK])
+		self.assertTrue(chk.status)
+
+	def test_same_results_as_checker(self):
+		expecteds = [self.expected(2000, tolerance="400"), self.expected(2100, tolerance="400"), self.expected(2300, field=3),
+			self.expected(9000), self.expected(9100, check_mode="not")]
+		messages = [self.message(1900), self.message(2200), self.message(2250, field=4), self.message(9050)]
+		chk = test_checker.Checker()
+		result = chk.check(json_expected=list(expecteds), json_output=list(messages))
+		inc = IncrementalChecker(expecteds)
+		matches = list(inc.matches(iter(messages)))
+		self.assertEqual(inc.result, result)
+		self.assertEqual([(m.msg, m.expected, m.status()) for m in matches], [(m.msg, m.expected, m.status()) for m in chk.retained])
+
+	def test_messages_out_of_order(self):
+		chk = IncrementalChecker([self.expected(1000)])
+		chk.feed(self.message(1000))
+		with self.assertRaises(ValueError):
+			chk.feed(self.message(999))
+
+
+	def test_chained_windows(self):
+		# Frames at 100 Hz with a tolerance of 15 ms: each tolerance window overlaps the next one.
+		expecteds = [self.expected(10 * i, tolerance="15") for i in range(1000)]
+		messages = [self.message(10 * i) for i in range(1000)]
+		inc = IncrementalChecker(expecteds)
+		self.assertEqual(sum(len(inc.feed(m)) for m in messages), 0)
+		self.assertEqual(len(inc.close()), 1000)
+
+		chk = test_checker.Checker()
+		self.assertEqual(chk.check(json_expected=expecteds, json_output=messages), 0)
+		# Bounded windows are emitted as the record is read, with the same Matches for these frames.
+		inc = IncrementalChecker(expecteds, Options(max_span=200))
+		matches = [match for m in messages for match in inc.feed(m)]
+		self.assertGreater(len(matches), 900)
+		matches += inc.close()
+		self.assertEqual(inc.result, 0)
+		self.assertEqual([(m.msg, m.expected, m.status()) for m in matches], [(m.msg, m.expected, m.status()) for m in chk.retained])
+
+	def test_fail_fast(self):
+		expecteds = [self.expected(1000), self.expected(2000, field=0), self.expected(3000), self.expected(4000, field=0)]
+		messages = [self.message(4010), self.message(1010), self.message(2010), self.message(3010)]
+		chk = test_checker.Checker(Options(fail_fast=True))
+		self.assertEqual(chk.check(json_expected=expecteds, json_output=messages), -1)
+		self.assertEqual([m.status() for m in chk.retained], [Status.OK, Status.MATCH_ERROR])
+		self.assertIs(chk.failure, chk.retained[-1])
+		self.assertEqual(chk.failure.expected.time, 2000)
+
+		inc = IncrementalChecker(expecteds, Options(fail_fast=True))
+		read = list()
+		self.assertEqual(inc.check(read.append(m) or m for m in sorted(messages, key=lambda m: m.time)), -1)
+		self.assertIs(inc.failure.expected, expecteds[1])
+		self.assertEqual([m.time for m in read], [1010, 2010, 3010])
+
+	def test_fail_fast_time_order(self):
+		expecteds = [self.expected(1000, tolerance="500"), self.expected(1200, field=2, tolerance="10")]
+		messages = [self.message(1000), self.message(1100, name="msg_2"), self.message(1200, field=2), self.message(2000)]
+		for options in (Options(), Options(fail_fast=True)):
+			chk = test_checker.Checker(options)
+			chk.check(json_expected=expecteds, json_output=messages)
+			self.assertEqual([m.msg.time for m in chk.retained], [1000, 1100, 1200, 2000])
+
+class TestParallel(unittest.TestCase):
+	def test_same_results_as_serial(self):
+		expecteds = list()
+		outputs = list()
+		for i in range(40):
+			name = "msg_{}".format(i % 4)
+			expecteds.append(Expected({"message": {"Field_1": i % 3, "Field_2": "a" * (i % 5)},
+				"name": name,
+				"time": 1000 + 50 * i,
+				"checkMode": "not" if i % 7 == 0 else "one",
+				"fieldsToCheck": ["Field_1", "Field_2"],
+				"tolerance": "120"}))
+			outputs.append(Message({"message": {"Field_1": i % 2, "Field_2": "a" * (i % 3)},
+				"name": name,
+				"time": 1010 + 45 * i}))
+		serial = test_checker.Checker()
+		parallel = test_checker.Checker(Options(jobs=2))
+		self.assertEqual(parallel.check(list(expecteds), list(outputs)), serial.check(list(expecteds), list(outputs)))
+		self.assertEqual([(m.msg, m.expected, m.score) for m in parallel.retained], [(m.msg, m.expected, m.score) for m in serial.retained])
+
+
+	def test_time_shards(self):
+		expected_nodes, record_nodes = bench_checker.generate(seed=3, messages=200, names=1, overlap=4, errors=0.2)
+		for options in (dict(), dict(max_candidates=2), dict(assignment=test_checker.Assignment.OPTIMAL)):
+			checks = list()
+			for jobs in (1, 3):
+				profile = test_checker.Profile()
+				chk = test_checker.Checker(Options(jobs=jobs, profile=profile, **options))
+				result = chk.check([Expected(n) for n in expected_nodes], [Message(n) for n in record_nodes])
+				checks.append((result, [(m.status(), m.score, m.msg and m.msg.time, m.expected and m.expected.time) for m in chk.retained]))
+			self.assertEqual(checks[0], checks[1])
+			self.assertEqual(profile.counters["shards"], 12)
+			# Shards overlap by the tolerances: the Messages near their bounds are scored twice.
+			self.assertGreater(profile.counters["shard_messages"], len(record_nodes))
+
+class TestRecords(unittest.TestCase):
+	RECORDS = [{"message": {"Field_1": [1, 2], "Field_2": "a], {b"}, "name": "msg_1", "time": 1000},
+		{"message": {"Field_1": 3.5}, "name": "msg_2", "time": 1100}]
+
+	def read_records(self, content, chunk_size):
+		with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as fh:
+			fh.write(content)
+		try:
+			return list(checker_records.iter_records(fh.name, chunk_size=chunk_size))
+		finally:
+			os.remove(fh.name)
+
+	def test_json_array(self):
+		content = json.dumps(self.RECORDS, indent="\t")
+		for chunk_size in (1, 7, 1 << 16):
+			self.assertEqual(self.read_records(content, chunk_size), self.RECORDS)
+		self.assertEqual(self.read_records(" [ ] ", 1), [])
+
+	def test_json_lines(self):
+		content = "\n".join(json.dumps(r) for r in self.RECORDS) + "\n\n"
+		self.assertEqual(self.read_records(content, 3), self.RECORDS)
+		self.assertEqual(self.read_records("", 3), [])
+
+	def test_truncated_json_array(self):
+		with self.assertRaises(ValueError):
+			self.read_records(json.dumps(self.RECORDS)[:-1], 5)
+		with self.assertRaises(ValueError):
+			self.read_records("[1, 2,]", 5)
+
+	def test_columnar(self):
+		records = self.RECORDS + [{"message": {"Field_1": None, "Field_2": {"a": [True]}, "Field_3": 1 << 70, "Field_4": "é"}, "name": "msg_1", "time": 1200},
+			{"message": {"Field_1": 7, "Field_2": "b"}, "name": "msg_1", "time": 1300}, {"message": {}, "name": "msg_3", "time": 1400}]
+		expected = [{"message": {"Field_1": 3.5}, "name": "msg_2", "time": 1100, "checkMode": "one", "fieldsToCheck": ["Field_1"], "tolerance": "10"},
+			{"message": {"Field_1": 7, "Field_2": "c"}, "name": "msg_1", "time": 1250, "checkMode": "one", "fieldsToCheck": ["Field_1", "Field_2"], "tolerance": "60"}]
+		with tempfile.TemporaryDirectory() as tmp:
+			paths = {name: os.path.join(tmp, name) for name in ("record.json", "record.col", "expected.json", "report.xml")}
+			with open(paths["record.json"], "w") as fh:
+				json.dump(records, fh)
+			with open(paths["expected.json"], "w") as fh:
+				json.dump(expected, fh)
+			checker_records.write_columnar(records, paths["record.col"])
+			self.assertEqual([checker_records.is_columnar(paths[name]) for name in ("record.json", "record.col")], [False, True])
+
+			with checker_records.ColumnarRecord(paths["record.col"], Message.from_fields) as record:
+				self.assertEqual(len(record), len(records))
+				self.assertEqual((list(record.times), [record.names[i] for i in record.name_ids]),
+					([r["time"] for r in records], [r["name"] for r in records]))
+				messages = list(record)
+				self.assertIs(record[1], messages[1])
+			self.assertEqual([(m.name, m.time, list(m._fields.items())) for m in messages],
+				[(r["name"], r["time"], list(r["message"].items())) for r in records])
+
+			reports = list()
+			for name in ("record.json", "record.col"):
+				self.assertEqual(test_checker.check_files(paths["expected.json"], paths[name], paths["report.xml"]), -1)
+				with open(paths["report.xml"]) as fh:
+					reports.append(fh.read())
+			self.assertEqual(reports[0], reports[1])
+
+	def test_expected_cache(self):
+		expected = [{"message": {"Field_1": [1, 2], "Field_2": "a"}, "name": "msg_1", "time": 1000,
+			"checkMode": "one", "fieldsToCheck": ["Field_1"], "tolerance": "100"}]
+		with tempfile.TemporaryDirectory() as tmp:
+			filename = os.path.join(tmp, "expected.json")
+			with open(filename, "w") as fh:
+				json.dump(expected, fh)
+			cache = checker_cache.ExpectedCache(os.path.join(tmp, "cache"))
+			loaded = [test_checker.load_expecteds(filename, cache) for _ in range(2)]
+			self.assertEqual((cache.hits, cache.misses), (1, 1))
+			self.assertEqual([(e.name, e.time, dict(e.fields())) for e in loaded[1]], [("msg_1", 1000.0, {"Field_1": [1, 2]})])
+			self.assertEqual(loaded[1][0].matcher.score({"Field_1": [1, 3]}), 1)
+
+			with open(filename, "w") as fh:
+				json.dump([dict(expected[0], time=2000)], fh)
+			self.assertEqual(test_checker.load_expecteds(filename, cache)[0].time, 2000.0)
+			self.assertEqual((cache.hits, cache.misses), (1, 2))
+			entries = sorted(os.listdir(cache.directory))
+			self.assertEqual(len(entries), 2)
+
+			for entry in entries:
+				with open(os.path.join(cache.directory, entry), "wb") as fh:
+					fh.write(b"corrupted")
+			self.assertEqual(test_checker.load_expecteds(filename, cache)[0].time, 2000.0)
+			self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+			# A read-only cache is still read.
+			with unittest.mock.patch("os.utime", side_effect=PermissionError):
+				self.assertEqual(test_checker.load_expecteds(filename, cache)[0].time, 2000.0)
+			self.assertEqual((cache.hits, cache.misses), (2, 3))
+			# Entries of another version of the checker are not read.
+			with unittest.mock.patch.object(checker_cache, "_CACHE_FORMAT", checker_cache._CACHE_FORMAT + 1):
+				test_checker.load_expecteds(filename, cache)
+			self.assertEqual((cache.hits, cache.misses), (2, 4))
+
+			cache.max_bytes = 0
+			cache.evict()
+			self.assertEqual(os.listdir(cache.directory), [])
+
+	def test_expected_cache_script(self):
+		# An entry written by an importer of test_checker is not read by the script, whose classes are those of __main__.
+		expected = [{"message": {"Field_1": 1}, "name": "msg_1", "time": 1000,
+			"checkMode": "not", "fieldsToCheck": ["Field_1"], "tolerance": "100"}]
+		with tempfile.TemporaryDirectory() as tmp:
+			paths = {name: os.path.join(tmp, name) for name in ("expected.json", "record.json", "report.xml", "cache")}
+			for name, nodes in (("expected.json", expected), ("record.json", [])):
+				with open(paths[name], "w") as fh:
+					json.dump(nodes, fh)
+			cache = checker_cache.ExpectedCache(paths["cache"])
+			self.assertEqual(test_checker.check_files(paths["expected.json"], paths["record.json"], paths["report.xml"],
+				options=Options(cache=cache)), 0)
+			for _ in range(2):
+				result = subprocess.run([sys.executable, test_checker.__file__, "-e", paths["expected.json"], "-r", paths["record.json"],
+					"-o", paths["report.xml"], "--cache", paths["cache"]], stdout=subprocess.DEVNULL, check=False)
+				self.assertEqual(result.returncode, 0)
+			self.assertEqual(len(os.listdir(paths["cache"])), 2)
+
+class TestBatch(unittest.TestCase):
+	EXPECTED = [{"message": {"Field_1": 1, "Field_2": 2}, "name": "msg_1", "time": 1000,
+		"checkMode": "one", "fieldsToCheck": ["Field_1"], "tolerance": "100"}]
+
+	def test_manifest(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			with open(os.path.join(tmp, "expected.json"), "w") as fh:
+				json.dump(self.EXPECTED, fh)
+			for name, value in (("ok", 1), ("ko", 5)):
+				with open(os.path.join(tmp, name + ".jsonl"), "w") as fh:
+					fh.write(json.dumps({"message": {"Field_1": value}, "name": "msg_1", "time": 1010}) + "\n")
+			with open(os.path.join(tmp, "manifest.jsonl"), "w") as fh:
+				for name in ("ok", "ko", "missing"):
+					fh.write(json.dumps({"expected": "expected.json", "record": name + ".jsonl", "report": name + ".xml"}) + "\n")
+
+			scenarios = checker_batch.read_manifest(os.path.join(tmp, "manifest.jsonl"))
+			self.assertEqual(scenarios[0]["record"], os.path.join(tmp, "ok.jsonl"))
+			results = checker_batch.check_batch(scenarios, test_checker.check_files)
+			self.assertEqual([r for r, _ in results], [0, -1, -1])
+			self.assertEqual([e is None for _, e in results], [True, True, False])
+			self.assertTrue(os.path.exists(os.path.join(tmp, "ko.xml")))
+
+
+class TestResults(unittest.TestCase):
+	EXPECTED = [{"message": {"Field_1": 1, "Field_2": 2}, "name": "msg_1", "time": 1000,
+		"checkMode": "one", "fieldsToCheck": ["Field_1", "Field_2"], "tolerance": "100"}]
+	RECORD = [{"message": {"Field_1": 1, "Field_2": 3}, "name": "msg_1", "time": 1010},
+		{"message": {"Field_1": 1}, "name": "msg_2", "time": 1020}]
+
+	def test_json_lines(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			expected, record = os.path.join(tmp, "expected.json"), os.path.join(tmp, "record.json")
+			with open(expected, "w") as fh:
+				json.dump(self.EXPECTED, fh)
+			with open(record, "w") as fh:
+				json.dump(self.RECORD, fh)
+			for name, stream in (("results.jsonl", False), ("results.jsonl.gz", True)):
+				results = os.path.join(tmp, name)
+				for append in (False, True):
+					with test_checker.JsonLinesReport(results, append=append) as report:
+						options = Options(reports=[report], stream=stream)
+						self.assertEqual(test_checker.check_files(expected, record, os.path.join(tmp, "report.xml"), options=options), -1)
+				with (gzip.open if stream else open)(results, "rt") as fh:
+					records = [json.loads(line) for line in fh]
+				self.assertEqual(sorted(records[:2], key=lambda r: r["name"]), [
+					{"status": "MATCH_ERROR", "score": 1.0, "name": "msg_1", "expected_time": 1000.0, "message_time": 1010.0, "differences": ["Field_2"]},
+					{"status": "NO_EXPECTED", "score": -1, "name": "msg_2", "expected_time": None, "message_time": 1020.0, "differences": []}])
+				self.assertEqual(records[2:], records[:2])
+
+	@unittest.skipIf(checker_scoring._numpy() is None, "numpy is not installed")
+	def test_score_type(self):
+		expected = [Expected(dict(self.EXPECTED[0], fieldsToCheck=["Field_1"]))]
+		records = list()
+		for count in (5, 40): # Below and above the window scored with numpy
+			output = [Message(dict(self.RECORD[0], time=1000 + i, message={"Field_1": 1 + i})) for i in range(count)]
+			chk = test_checker.Checker()
+			self.assertEqual(chk.check(expected, output), 0)
+			records.append([json.dumps(m.to_record()) for m in chk.retained if m.expected is not None])
+		self.assertEqual(records[0], records[1])
+		self.assertIn('"score": 0.0', records[0][0])
+
+	def test_verbose(self):
+		expected = [Expected(dict(self.EXPECTED[0], time=t)) for t in (1000, 2000, 3000)]
+		output = [Message(dict(self.RECORD[0], time=t, message={"Field_1": 1, "Field_2": f, "Field_3": 3})) for t, f in ((1010, 2), (2010, 3), (3010, 4))]
+		stream = io.StringIO()
+		report = test_checker.VerboseReport(stream, max_matches=1, max_fields=1)
+		self.assertEqual(test_checker.Checker().check(expected, output, verbose=report), -1)
+		self.assertEqual((report.rendered, report.skipped), (1, 0))
+		text = stream.getvalue()
+		self.assertIn("Field_2", text)
+		self.assertNotIn("Field_1", text)
+		self.assertIn("(2 more fields not shown)", text)
+		self.assertTrue(text.endswith("(1 more matches not shown)\n"))
+
+class TestStartup(unittest.TestCase):
+	def test_presentation_imported_lazily(self):
+		code = "import sys, test_checker; test_checker.Checker().check([], []); print(sorted({'colorama', 'tabulate', 'datetime'} & set(sys.modules)))"
+		output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+			check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+		self.assertEqual(output.strip(), "[]")
+
+
+class TestProfile(unittest.TestCase):
+	def test_phases_and_counters(self):
+		expecteds = [TestIncremental.expected(t) for t in (1000, 2000, 3000)]
+		messages = [TestIncremental.message(t) for t in (1010, 1020, 2990, 5000)]
+		seen = list()
+		profile = test_checker.Profile(callback=lambda phase, seconds: seen.append(phase))
+		chk = test_checker.Checker(Options(profile=profile))
+		with tempfile.TemporaryDirectory() as tmp:
+			self.assertEqual(chk.check(expecteds, messages, filename_report=os.path.join(tmp, "report.xml")), -1)
+		self.assertEqual(seen, ["index", "window", "fuzzy_compare", "assignment", "retention", "sort", "reports", "xml"])
+		self.assertEqual(profile.calls["fuzzy_compare"], 3)
+		self.assertEqual(profile.counters, {"candidates": 3, "candidates_max": 2, "compared_fields": 6, "expecteds": 3, "messages": 4,
+			"pairs": 3, "retained": 5})
+		self.assertEqual(set(profile.to_dict()["phases"]), set(seen))
+		self.assertIn("fuzzy_compare", str(profile))
+
+class TestBench(unittest.TestCase):
+	def test_generate(self):
+		expecteds, record = bench_checker.generate(seed=3, messages=200, names=4, overlap=2, fields=3, types=("number", "string"), errors=0.1)
+		self.assertEqual((expecteds, record), bench_checker.generate(seed=3, messages=200, names=4, overlap=2, fields=3, types=("number", "string"), errors=0.1))
+		self.assertEqual(len(expecteds), 200)
+		self.assertLess(len(record), 200)
+		self.assertEqual({e["name"] for e in expecteds}, {"msg_0", "msg_1", "msg_2", "msg_3"})
+		self.assertTrue(all(isinstance(r["message"]["Field_1"], str) and not isinstance(r["message"]["Field_2"], str) for r in record))
+		with self.assertRaises(ValueError):
+			bench_checker.generate(types=("number", "date"))
+
+	def test_scale(self):
+		result = bench_checker.bench_scale(repeat=1, messages=50)
+		self.assertEqual(list(result), ["build", "fuzzy_sub", "candidates", "check", "report"])
+		self.assertEqual(bench_checker.compare({"result": result}, {"result": result})["check"], 1.0)
+
 class TestQuality(unittest.TestCase):
 	def test_pylint(self):
 		curr_dir = os.path.dirname(__file__)
-		(pylint_stdout, _) = lint.py_run(os.path.join(curr_dir, "test_checker.py"), return_std=True)
-		output = pylint_stdout.read()
-		m = re.search("Your code has been rated at ([\\d\\.]+)/10 \\(previous", output)
-		self.assertNotEqual(m, None)
-		ev = float(m.group(1))
-		self.assertEqual(ev, 10.0)
+		for module in ("test_checker", "checker_assignment", "checker_batch", "checker_cache", "checker_profile", "checker_records", "checker_reports", "checker_scoring"):
+			with self.subTest(module=module):
+				(pylint_stdout, _) = lint.py_run(os.path.join(curr_dir, module + ".py"), return_std=True)
+				output = pylint_stdout.read()
+				m = re.search("Your code has been rated at ([\\d\\.]+)/10", output) # Without previous run for a new module
+				self.assertNotEqual(m, None)
+				ev = float(m.group(1))
+				self.assertEqual(ev, 10.0)
 
 
 if __name__ == '__main__':
 	suite = unittest.TestLoader().loadTestsFromTestCase(TestBasics)
 	unittest.TextTestRunner(verbosity=1).run(suite)
 
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestFuzzySub)
+	unittest.TextTestRunner(verbosity=1).run(suite)
+
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestIncremental)
+	unittest.TextTestRunner(verbosity=1).run(suite)
+
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestParallel)
+	unittest.TextTestRunner(verbosity=1).run(suite)
+
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestRecords)
+	unittest.TextTestRunner(verbosity=1).run(suite)
+
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestBatch)
+	unittest.TextTestRunner(verbosity=1).run(suite)
+
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestResults)
+	unittest.TextTestRunner(verbosity=1).run(suite)
+
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestStartup)
+	unittest.TextTestRunner(verbosity=1).run(suite)
+
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestProfile)
+	unittest.TextTestRunner(verbosity=1).run(suite)
+
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestBench)
+	unittest.TextTestRunner(verbosity=1).run(suite)
+
 	suite = unittest.TestLoader().loadTestsFromTestCase(TestQuality)
 	unittest.TextTestRunner(verbosity=1).run(suite)
 
@@ -3,61 +3,52 @@ Test Checker JSON for TopLink products line.
 """
 
 import argparse
-import datetime
+import array
+import bisect
+import collections
+import contextlib
 import enum
 import functools
+import heapq
 import itertools
 import json
-import string
+import math
+import sys
+from time import perf_counter
 
-from tabulate import tabulate
-
-import colorama
+from checker_assignment import greedy_order, optimal_order
+from checker_batch import run_manifest
+from checker_profile import Profile
+from checker_cache import ExpectedCache
+from checker_records import ColumnarRecord, is_columnar, iter_records, write_columnar
+from checker_reports import JsonLinesReport, VerboseReport, XmlReport, xml_message
+from checker_scoring import MISSING, NUMERIC_WINDOW, numeric_window, shared_matcher
+from checker_scoring import fuzzy_sub, score_cache_info # pylint: disable=unused-import
 
 
 __version__ = 0.3
 
 
 
+@functools.lru_cache(maxsize=None)
+def _colorama():
+	"""
+	Returns the colorama module. It is imported and initialized when a report is first rendered,
+	and only once per process: each call of colorama.init wraps the standard streams again.
+	"""
+	import colorama # pylint: disable=import-outside-toplevel
+	colorama.init()
+	return colorama
+
+
 def pretty_print(data, headers, fields):
 	"""
 	Used to print tabular data in a terminal.
 	"""
+	from tabulate import tabulate # pylint: disable=import-outside-toplevel
 	return tabulate(list(itertools.zip_longest(fields, *data)), headers=headers)
 
 
-def fuzzy_sub(a, b):
-	"""
-	Returns the difference between a and b. Substraction for number.
-	For strings: it returns the sum of difference between positions of the letters.
-	"""
-	diff = 0
-	try:
-		return float(a) - float(b)
-	except ValueError:
-		_a = str(a)
-		_b = str(b)
-		diff = abs(len(_a) - len(_b))
-		for chr1, chr2 in zip(_a, _b):
-			diff += abs(string.printable.index(chr1) - string.printable.index(chr2))
-	except TypeError:
-		_a = a
-		_b = b
-		if not isinstance(a, list):
-			_a = str(a)
-		if not isinstance(b, list):
-			_b = str(b)
-		if not isinstance(_a, type(_b)): #pylint disable: unidiomatic-typecheck
-			diff += 1
-		diff += abs(len(_a) - len(_b))
-		for val1, val2 in zip(_a, _b):
-			try:
-				diff += abs(float(val1) - float(val2))
-			except ValueError:
-				diff += abs(string.printable.index(str(val1)) - string.printable.index(str(val2)))
-			#diff += abs(string.printable.index(chr1) - string.printable.index(chr2))
-	return diff
-
 class CheckMode(enum.Enum):
 	"""
 	Check mode defined for each Expected
@@ -66,6 +57,13 @@ class CheckMode(enum.Enum):
 	MORE = 1
 	NOT = 2
 
+class Assignment(enum.Enum):
+	"""
+	Method pairing the Expecteds with their candidate Messages
+	"""
+	GREEDY = 0 # By increasing Match score
+	OPTIMAL = 1 # As many pairs as possible, with the lowest sum of scores
+
 class Status(enum.Enum):
 	"""
 	Status defined for each match msg <-> expected
@@ -76,15 +74,54 @@ class Status(enum.Enum):
 	NO_EXPECTED = 3 # A message without expected
 
 
+def _phase(profile, name):
+	"""
+	Returns the context measuring the phase `name` in `profile`, if any.
+	"""
+	return contextlib.nullcontext() if profile is None else profile.phase(name)
+
+
+class Options(collections.namedtuple("Options", ("jobs", "assignment", "fail_fast", "max_candidates", "profile", "reports", "cache", "stream", "max_span"),
+		defaults=(1, Assignment.GREEDY, False, None, None, (), None, False, None))):
+	"""
+	Options of the checks (see Checker, IncrementalChecker and check_files).
+	`jobs` is the number of processes scoring the candidates, by time shards of each message name.
+	`assignment` is the method pairing the Expecteds with their candidate Messages.
+	If `fail_fast`, the check stops at the first failing Match (see IncrementalChecker).
+	`max_candidates` is the number of best ranked candidate Messages kept per Expected (all if None).
+	A lower ranked candidate is sometimes the one claimed: a limit can change the result.
+	The phases of the checks are measured in `profile` (see Profile), if any.
+	Each Match is also written in the `reports` (see JsonLinesReport).
+	`check_files` loads the Expecteds through the ExpectedCache `cache`, if any,
+	and checks the record as it is read if `stream` (see IncrementalChecker).
+	`max_span` bounds the time span of the windows of IncrementalChecker (unbounded if None), an approximation.
+	"""
+	__slots__ = ()
+
+
 class Message(object):
 	"""
 	This class manages an output message in JSON format.
+	Messages are numerous: the name and the field names are interned and the JSON node is not kept.
 	"""
+	__slots__ = ("name", "time", "_fields")
+
 	def __init__(self, json_node):
-		self.name = json_node["name"]
+		self.name = sys.intern(json_node["name"])
 		self.time = float(json_node["time"])
-		self._fields = {k: v for k, v in json_node["message"].items()}
-		self._orig = json_node
+		self._fields = {sys.intern(k): v for k, v in json_node["message"].items()}
+
+	@classmethod
+	def from_fields(cls, name, time, fields):
+		"""
+		Returns the Message `name` received at `time` with `fields`, built without a JSON node (see ColumnarRecord).
+		The name and the keys of `fields` must be interned already.
+		"""
+		msg = cls.__new__(cls)
+		msg.name = name
+		msg.time = time
+		msg._fields = fields
+		return msg
 
 
 class Expected(object):
@@ -96,8 +133,8 @@ class Expected(object):
 		self.time = float(json_node["time"])
 		self.tolerance = float(json_node["tolerance"])
 		self._fields = {k: v for k, v in json_node["message"].items() if k in json_node["fieldsToCheck"]}
+		self.matcher = shared_matcher(self._fields)
 		self.check_mode = CheckMode[json_node["checkMode"].upper()]
-		self._orig = json_node
 		self._matched = None
 
 	def fields(self):
@@ -112,10 +149,13 @@ class Match(object):
 	"""
 	This class represents a matching between a Output object and Expected object.
 	"""
-	def __init__(self, message, expected):
+	__slots__ = ("msg", "expected", "score")
+
+	def __init__(self, message, expected, score=None):
 		"""
 		Constructor.
 		Constructs a Match object embedding ``message`` and its ``expected``
+		``score`` is the score of ``message`` already computed by ``expected.matcher``, if any.
 		"""
 		self.score = 0
 		if expected is not None:
@@ -124,14 +164,7 @@ class Match(object):
 			if message is not None:
 				self.msg = message
 				self.expected = expected
-				for k, v in self.expected.fields():
-					if k not in self.msg._fields:
-						try:
-							self.score += abs(float(v))
-						except (ValueError, TypeError):
-							self.score += len(v) + 1
-					elif self.msg._fields[k] != v:
-						self.score += fuzzy_sub(self.msg._fields[k], v)
+				self.score = self.expected.matcher.score(self.msg._fields) if score is None else score
 			else:
 				if self.expected.check_mode != CheckMode.NOT:
 					self.score = -2
@@ -160,22 +193,57 @@ class Match(object):
 		"""
 		if self.score == 0:
 			return Status.OK
-		elif self.score == -1:
+		if self.score == -1:
 			return Status.NO_EXPECTED
-		elif self.score == -2:
+		if self.score == -2:
 			return Status.MATCH_NOT_FOUND
 		return Status.MATCH_ERROR
 
+	def differences(self):
+		"""
+		Returns the keys of the checked fields missing or different in the Message, in the order of the Expected.
+		"""
+		if self.expected is None or self.msg is None:
+			return list()
+		fields = self.msg._fields
+		return [k for k, v in self.expected._fields.items() if fields.get(k, MISSING) != v]
+
+	def to_record(self):
+		"""
+		Converts `self` to a dict of JSON values (see JsonLinesReport).
+		The score is written as a float: its type depends on the comparators, and on numpy (see `checker_scoring.numeric_window`).
+		"""
+		return {"status": self.status().name,
+			"score": float(self.score),
+			"name": self.expected.name if self.expected else self.msg.name,
+			"expected_time": self.expected.time if self.expected else None,
+			"message_time": self.msg.time if self.msg else None,
+			"differences": self.differences()}
+
 	def __repr__(self): # pragma: no cover
 		"""
 		Returns a string repr of `self`
 		"""
+		return self.render()
+
+	def render(self, max_fields=None): # pragma: no cover
+		"""
+		Returns a string repr of `self` with at most `max_fields` fields (all if None).
+		The differing fields are shown first, then the other checked fields.
+		"""
+		colorama = _colorama()
 		fields = list()
 		data_output = None
 		data_expected = None
 		msg = self.msg._fields if self.msg else dict()
 		expected = self.expected._fields if self.expected else dict()
 		fields = sorted(list(set(list(msg.keys()) + list(expected.keys()))))
+		hidden = ""
+		if max_fields is not None and len(fields) > max_fields:
+			differences = set(self.differences())
+			shown = sorted(fields, key=lambda k: 0 if k in differences else 1 if k in expected else 2)[:max_fields]
+			hidden = "\n({} more fields not shown)".format(len(fields) - max_fields)
+			fields = sorted(shown)
 
 		def colored_red(key):
 			"""
@@ -183,9 +251,9 @@ class Match(object):
 			"""
 			if key not in self.msg._fields:
 				return colorama.Fore.MAGENTA + colorama.Style.BRIGHT + "???" + colorama.Style.RESET_ALL
-			elif (key in expected) and (msg[key] != expected[key]):
+			if (key in expected) and (msg[key] != expected[key]):
 				return colorama.Fore.RED + str(msg[key]) + colorama.Style.RESET_ALL
-			elif (key in expected) and (msg[key] == expected[key]):
+			if (key in expected) and (msg[key] == expected[key]):
 				return colorama.Fore.GREEN + str(msg[key]) + colorama.Style.RESET_ALL
 			return str(msg[key])
 
@@ -199,25 +267,25 @@ class Match(object):
 			data_output = info([self.msg.time, self.msg.name]) + [colored_red(k) for k in fields]
 			s = colorama.Fore.CYAN + "This Output has no expected\n" + colorama.Style.RESET_ALL
 			s += str(tab([[], data_output]))
-			return s
+			return s + hidden
 
 		if self.msg is None:
 			if self.expected.check_mode == CheckMode.ONE:
 				data_expected = info([self.expected.time, self.expected.name]) + [default_expected(k) for k in fields]
 				s = colorama.Fore.RED + "No output for this required expected \n" + colorama.Style.RESET_ALL
 				s += str(tab([data_expected, []]))
-				return s
+				return s + hidden
 			data_expected = info([self.expected.time, self.expected.name]) + [default_expected(k) for k in fields]
 			s = colorama.Fore.GREEN + "No output for this rejected expected \n" + colorama.Style.RESET_ALL
 			s += str(tab([data_expected, []]))
-			return s
+			return s + hidden
 
 		if self.expected and self.msg and self.score not in (0, -1):
 			data_output = info([self.msg.time, self.msg.name]) + [colored_red(k) for k in fields]
 			data_expected = info([self.expected.time, self.expected.name]) + [default_expected(k) for k in fields]
 			s = colorama.Fore.RED + "Output does not match Expected\n" + colorama.Style.RESET_ALL
 			s += str(tab([data_expected, data_output]))
-			return s
+			return s + hidden
 
 		data_output = info([self.msg.time, self.msg.name]) + [colored_red(k) for k in fields]
 		data_expected = info([self.expected.time, self.expected.name]) + [default_expected(k) for k in fields]
@@ -227,131 +295,355 @@ class Match(object):
 		else:
 			s = colorama.Fore.GREEN + "Expected matches this Output \n" + colorama.Style.RESET_ALL
 		s += str(tab([data_expected, data_output]))
-		return s
+		return s + hidden
 
 
 	def to_xml(self): # pragma: no cover
 		"""
 		Converts `self` to a XML Node
 		"""
-		status = {Status.OK: "MESSAGE MATCHED",
-            Status.MATCH_NOT_FOUND: "EXPECTED WITHOUT MESSAGE",
-            Status.MATCH_ERROR: "MESSAGE NOT MATCHED",
-            Status.NO_EXPECTED: "MESSAGE UNCHECKED"
-		         }[self.status()]
-		name = self.expected.name if self.expected else self.msg.name
-		interface = "JSON"
-		time_from = self.expected.time if self.expected else self.msg.time
-		time_to = time_from + self.expected.tolerance if self.expected else 0
-		return """
-	<Message>
-		<Status>{status}</Status>
-		<Name>{name}</Name>
-		<Interface>{interface}</Interface>
-		<From>{frm}</From>
-		<To>{to}</To>
-	</Message>""".format(
-            status=status,
-            name=name,
-            interface=interface,
-            frm=datetime.datetime.fromtimestamp(time_from/1000).strftime('%H:%M:%S.%f'),
-            to=datetime.datetime.fromtimestamp(time_to/1000).strftime('%H:%M:%S.%f'))
-
-def _fuzzy_compare(src, potential_matches):
+		return xml_message(self)
+
+
+def _ranked_candidates(src, potential_matches, max_candidates=None):
 	"""
 	Compares the `src` (an Expected) to a list of potential matching Messages.
-	It will return a list of Message that match or aim to match the `src`
+	Returns the (position in `potential_matches`, score) pairs of the Messages that match or aim to match the `src`,
+	best ranked first, limited to the `max_candidates` best ranked ones (all if None).
 	"""
-	all_fields_src = src._fields.values()
+	matcher = src.matcher
+	window = None
+	if matcher.numeric and len(potential_matches) >= NUMERIC_WINDOW:
+		window = numeric_window(matcher, potential_matches)
+	if window is not None:
+		distances, scores = window
+		diff = [(dist, pos) for pos, dist in enumerate(distances) if dist == 0 or src.check_mode != CheckMode.NOT]
+	else:
+		diff = _ranked_distances(src, potential_matches, max_candidates)
+
+	if max_candidates is None:
+		ranked = sorted(diff, key=lambda a: abs(a[0]))
+	else:
+		ranked = heapq.nsmallest(max_candidates, diff, key=lambda a: abs(a[0]))
+	if window is not None:
+		return [(pos, scores[pos]) for _, pos in ranked]
+	return [(pos, matcher.score(potential_matches[pos]._fields)) for _, pos in ranked]
+
+
+def _ranked_distances(src, potential_matches, max_candidates):
+	"""
+	Step of `_ranked_candidates`: returns the (distance, position) of the Messages of `potential_matches`
+	that can be retained. The distance of a Message stops being computed as soon as it is known
+	to be too far: not null for a NOT Expected, worse than the `max_candidates` best ones otherwise.
+	"""
+	matcher = src.matcher
 	diff = list()
-	for msg in potential_matches:
-		all_fields_msg = msg._fields.values()
-		dist = sum(d * 10 ** (3 - pos) for pos, d in enumerate(map(fuzzy_sub, all_fields_src, all_fields_msg)))
-		if dist != 0:
-			if src.check_mode != CheckMode.NOT:
-				diff.append((dist, msg))
+	best = list() # Opposites of the `max_candidates` lowest absolute distances, as a heap
+	bound = 0 if src.check_mode == CheckMode.NOT else None
+	for pos, msg in enumerate(potential_matches):
+		dist = matcher.distance(msg._fields, bound)
+		if dist is None or (dist != 0 and src.check_mode == CheckMode.NOT):
+			continue
+		diff.append((dist, pos))
+		if max_candidates is not None and bound != 0 and not math.isnan(dist):
+			heapq.heappush(best, -abs(dist))
+			if len(best) > max_candidates:
+				heapq.heappop(best)
+			if len(best) == max_candidates:
+				bound = -best[0]
+	return diff
+
+
+class _CandidateIndex(object):
+	"""
+	Groups Messages by name and sorts each group by time, so that the Messages
+	in the tolerance window of an Expected are found with a bisect range query.
+	The times and the positions of each group are held in contiguous arrays.
+	Over a ColumnarRecord, the groups are read from its columns: only the Messages in a window are built.
+	"""
+	def __init__(self, messages):
+		if isinstance(messages, ColumnarRecord):
+			groups = messages.groups()
+			times = messages.times
 		else:
-			diff.append((dist, msg))
+			groups = dict()
+			for pos, msg in enumerate(messages):
+				groups.setdefault(msg.name, list()).append(pos)
+			times = None
+		self._groups = dict()
+		for name, positions in groups.items():
+			group_times = array.array("d", (messages[pos].time for pos in positions) if times is None else (times[pos] for pos in positions))
+			order = sorted(range(len(positions)), key=group_times.__getitem__)
+			self._groups[name] = (
+				array.array("d", (group_times[i] for i in order)),
+				array.array("q", (positions[i] for i in order)))
+
+	def window(self, name, low, high):
+		"""
+		Returns the positions of the Messages named `name` with `low <= time <= high`, in order.
+		"""
+		group = self._groups.get(name)
+		if group is None:
+			return list()
+		times, positions = group
+		first = bisect.bisect_left(times, low)
+		last = bisect.bisect_right(times, high)
+		return sorted(positions[first:last])
+
+	def candidates(self, exp):
+		"""
+		Returns the positions of the Messages in bounds of `exp` relative to its tolerance.
+		"""
+		return self.window(exp.name, exp.time - exp.tolerance, exp.time + exp.tolerance)
+
+
+def _candidates(json_expected, json_output, max_candidates=None):
+	"""
+	Returns, for each Expected of `json_expected`, the list of Match with its candidate Messages ranked by `_ranked_candidates`.
+	"""
+	return [[Match(json_output[pos], e, score) for pos, score in pairs] for e, pairs in zip(json_expected, _candidate_pairs(json_expected, json_output, max_candidates))]
+
+
+def _candidate_pairs(json_expected, json_output, max_candidates=None, profile=None):
+	"""
+	Same as `_candidates`, without the Matches: generator yielding, for each Expected,
+	the list of (position in `json_output`, score) pairs.
+	"""
+	if profile is None:
+		index = _CandidateIndex(json_output)
+		for e in json_expected:
+			positions = index.candidates(e)
+			yield [(positions[i], score) for i, score in _ranked_candidates(e, [json_output[pos] for pos in positions], max_candidates)]
+		return
+
+	with profile.phase("index"):
+		index = _CandidateIndex(json_output)
+	window_time = compare_time = 0.0
+	for e in json_expected:
+		start = perf_counter()
+		positions = index.candidates(e)
+		candidates = [json_output[pos] for pos in positions]
+		scored = perf_counter()
+		pairs = [(positions[i], score) for i, score in _ranked_candidates(e, candidates, max_candidates)]
+		window_time += scored - start
+		compare_time += perf_counter() - scored
+		profile.count("candidates", len(candidates))
+		profile.peak("candidates_max", len(candidates))
+		profile.count("compared_fields", (len(candidates) + len(pairs)) * len(e.matcher.keys))
+		yield pairs
+	profile.add_time("window", window_time, len(json_expected))
+	profile.add_time("fuzzy_compare", compare_time, len(json_expected))
+
+
+def _score_partition(json_expected, json_output, max_candidates=None):
+	"""
+	Worker of `_parallel_candidates`. Returns the list of the pairs yielded by `_candidate_pairs`.
+	"""
+	return list(_candidate_pairs(json_expected, json_output, max_candidates))
+
+
+_SHARDS_PER_JOB = 4 # Shards scored per worker process, for balance
+
+
+def _shards(json_expected, json_output, jobs):
+	"""
+	Step of `_parallel_candidates`: splits the Expecteds by name, then by time into about `_SHARDS_PER_JOB` * `jobs`
+	shards of the same size. Returns the shards as (positions of the Expecteds, positions of the Messages).
+	The Messages of a shard are those of its name in the union of the tolerance windows of its Expecteds,
+	widened to a single span: the shards of a name overlap by their tolerances.
+	"""
+	by_name = dict()
+	for pos, e in enumerate(json_expected):
+		by_name.setdefault(e.name, list()).append(pos)
+	index = _CandidateIndex(json_output)
+	size = max(1, -(-len(json_expected) // (_SHARDS_PER_JOB * jobs)))
+	shards = list()
+	for name, positions in by_name.items():
+		positions.sort(key=lambda pos: json_expected[pos].time)
+		for first in range(0, len(positions), size):
+			shard = positions[first:first + size]
+			low = min(json_expected[pos].time - json_expected[pos].tolerance for pos in shard)
+			high = max(json_expected[pos].time + json_expected[pos].tolerance for pos in shard)
+			shards.append((shard, index.window(name, low, high)))
+	return shards
+
+
+def _parallel_candidates(json_expected, json_output, jobs, max_candidates=None, profile=None):
+	"""
+	Same as `_candidate_pairs`, computed by `jobs` worker processes. Returns an iterable.
+	Candidates always share the name of their Expected and lie in its tolerance window: the Expecteds are
+	scored by time shards of each name, with the Messages of their span (see `_shards`). The Messages near
+	the bounds of a shard are also scored in the next one: they are reconciled by the assignment of `_match`,
+	that ranks the pairs of all the shards together. Each Expected gets the same candidates as in a single process.
+	"""
+	if jobs <= 1:
+		return _candidate_pairs(json_expected, json_output, max_candidates, profile)
+	with _phase(profile, "sharding"):
+		shards = _shards(json_expected, json_output, jobs)
+	if len(shards) <= 1:
+		return _candidate_pairs(json_expected, json_output, max_candidates, profile)
+	if profile is not None:
+		profile.count("shards", len(shards))
+		profile.count("shard_messages", sum(len(msg_positions) for _, msg_positions in shards))
+
+	result = [None] * len(json_expected)
+	import concurrent.futures # pylint: disable=import-outside-toplevel
+	with _phase(profile, "parallel_scoring"), concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+		scored = pool.map(_score_partition, [[json_expected[pos] for pos in positions] for positions, _ in shards],
+			[[json_output[pos] for pos in msg_positions] for _, msg_positions in shards], itertools.repeat(max_candidates),
+			chunksize=max(1, len(shards) // (_SHARDS_PER_JOB * jobs)))
+		for (positions, msg_positions), pairs in zip(shards, scored):
+			for pos, candidates in zip(positions, pairs):
+				result[pos] = [(msg_positions[i], score) for i, score in candidates]
+	return result
+
+
+class _CandidateTable(object):
+	"""
+	The candidate pairs of Expecteds and Messages, as parallel sequences: arrays of the positions
+	of the Expected and of the Message, lists of the score and of the time of the Message.
+	Expecteds without candidate are listed apart. Matches are only built for the pairs retained.
+	"""
+	def __init__(self, json_expected, json_output, pairs):
+		self.json_expected = json_expected
+		self.json_output = json_output
+		self.expecteds = array.array("q")
+		self.messages = array.array("q")
+		# Scores keep their type, as in the Matches. Scores and times are lists of the existing
+		# objects: sorting by them builds no new key object.
+		self.scores = list()
+		self.times = list()
+		self.alone = list()
+		# Over a ColumnarRecord, the times are read from its column: no Message is built for a pair.
+		times = json_output.times if isinstance(json_output, ColumnarRecord) else None
+		for exp, candidates in enumerate(pairs):
+			if not candidates:
+				self.alone.append(exp)
+			for msg, score in candidates:
+				self.expecteds.append(exp)
+				self.messages.append(msg)
+				self.scores.append(score)
+				self.times.append(json_output[msg].time if times is None else times[msg])
+
+	def __len__(self):
+		return len(self.scores)
+
+	def match(self, pair):
+		"""
+		Returns the Match of the pair at position `pair`.
+		"""
+		return Match(self.json_output[self.messages[pair]], self.json_expected[self.expecteds[pair]], self.scores[pair])
+
+	def greedy_order(self):
+		"""
+		Returns the positions of the pairs by score, then by time of the Message: the order of their Matches.
+		"""
+		return greedy_order(self.scores, self.times)
+
+	def optimal_order(self):
+		"""
+		Returns the positions of the pairs retained by the optimal assignment, in order.
+		"""
+		return optimal_order(self.expecteds, self.messages, self.scores, [e.time for e in self.json_expected])
 
-	return [x[1] for x in sorted(diff, key=lambda a: abs(a[0]))]
+
+def _match(json_expected, json_output, options):
+	"""
+	Pairs the Expecteds in `json_expected` with the Messages in `json_output`, with the `options` (see Options).
+	Returns the list of Match, ordered by time.
+	"""
+	profile = options.profile
+	# The candidates are scored as the table is filled: their lists are released one by one.
+	table = _CandidateTable(json_expected, json_output,
+		_parallel_candidates(json_expected, json_output, options.jobs, options.max_candidates, profile))
+
+	with _phase(profile, "assignment"):
+		order = table.optimal_order() if options.assignment == Assignment.OPTIMAL else table.greedy_order()
+		# Expecteds without candidate claim nothing and are ranked apart.
+		alone = sorted(table.alone, key=lambda exp: json_expected[exp].time)
+	with _phase(profile, "retention"):
+		retained = list()
+		claimed_outputs = set()
+		claimed_expecteds = set()
+		expecteds, messages = table.expecteds, table.messages
+		remaining = len(json_expected) - len(table.alone)
+		for pair in order:
+			if not remaining:
+				break
+			exp, msg = expecteds[pair], messages[pair]
+			if exp in claimed_expecteds or msg in claimed_outputs:
+				continue
+			claimed_outputs.add(msg)
+			claimed_expecteds.add(exp)
+			retained.append(table.match(pair))
+			remaining -= 1
+		claimed_expecteds.update(alone)
+		retained += [Match(None, json_expected[exp]) for exp in alone]
+
+		for msg, output in enumerate(json_output):
+			if msg not in claimed_outputs:
+				retained.append(Match(output, None))
+
+		for exp, e in enumerate(json_expected):
+			if exp not in claimed_expecteds:
+				retained.append(Match(None, e))
+
+	with _phase(profile, "sort"):
+		retained.sort(key=lambda x: x.msg.time if x.msg is not None else x.expected.time)
+	if profile is not None:
+		profile.count("expecteds", len(json_expected))
+		profile.count("messages", len(json_output))
+		profile.count("pairs", len(table))
+		profile.count("retained", len(retained))
+	return retained
 
 
 class Checker(object):
 	"""
 	The `Checker` is used to check a list of JSON messages with a list of JSON Expecteds.
 	"""
-	def __init__(self):
+	def __init__(self, options=None):
 		"""
 		Constructors.
+		The checks are made with the `options` (see Options), the default ones if None.
 		"""
-		colorama.init()
+		self.options = Options() if options is None else options
 		self.retained = list()
 		self.status = False
+		self.failure = None
 
 	def check(self, json_expected, json_output, filename_report=None, verbose=False):
 		"""
 		Checks if the elements in `json_expected` match elements in `json_output`.
+		If `verbose`, the failing Matches are printed (see VerboseReport, that `verbose` can also be).
+		Each Match is also written in the reports of the options.
 		Returns 0 if OK. Returns -1 otherwise.
 
-		see also self.status
+		see also self.status and self.failure
 		"""
-		self.status = False
-		self.retained = list()
-		def in_tolerance(exp, msg):
-			"""
-			Returns True if msg is in bounds of exp relative to its tolerance.
-			"""
-			return ((exp.time - exp.tolerance) <= msg.time <= (exp.time + exp.tolerance)) and (exp.name == msg.name)
-
-		assoc = list()
-		for e in json_expected:
-			msg_list = [o for o in json_output if in_tolerance(e, o)]
-			diff_list = _fuzzy_compare(e, msg_list)
-			if diff_list:
-				for diff in diff_list:
-					assoc.append(Match(diff, e))
-			else:
-				assoc.append(Match(None, e))
-
-		left_outputs = json_output
-		left_expecteds = json_expected
-
-		for a in sorted(assoc):
-			if a.msg is not None and (a.msg in [x.msg for x in self.retained]):
-				continue
-			elif a.expected in [x.expected for x in self.retained]:
-				continue
-
-			if a.msg and a.msg in left_outputs:
-				m = a.msg
-				left_outputs.remove(a.msg)
-			else:
-				m = None
-
-			e = a.expected
-			left_expecteds.remove(a.expected)
-			self.retained.append(Match(m, e))
-
-		for msg in left_outputs:
-			if msg not in [x.msg for x in self.retained]:
-				self.retained.append(Match(msg, None))
-
-		for e in left_expecteds:
-			self.retained.append(Match(None, e))
-
-		self.retained = sorted(self.retained, key=lambda x: x.msg.time if x.msg is not None else x.expected.time)
+		if self.options.fail_fast:
+			# Windows are checked in time order: only those up to the first failure are scored.
+			chk = IncrementalChecker(json_expected, self.options)
+			self.retained = sorted(chk.matches(sorted(json_output, key=lambda x: x.time)),
+				key=lambda x: x.msg.time if x.msg is not None else x.expected.time) # In time order, as by _match
+			self.failure = chk.failure
+		else:
+			self.retained = _match(json_expected, json_output, self.options)
+			self.failure = next((m for m in self.retained if m.score not in (0, -1)), None)
 
 		result = 0
 
-		for match in self.retained:
-			if match.score not in (0, -1):
-				result = -1
-			if verbose:
-				print(match, "\n")
+		with _phase(self.options.profile, "reports"), _verbose_reports(verbose, self.options.reports) as sinks:
+			for match in self.retained:
+				if match.score not in (0, -1):
+					result = -1
+				for report in sinks:
+					report.write(match)
 		self.status = result == 0
 
 		if filename_report:
-			self.to_xml(filename_report)
+			with _phase(self.options.profile, "xml"):
+				self.to_xml(filename_report)
 
 		return result
 
@@ -359,26 +651,297 @@ class Checker(object):
 		"""
 		Writes Matching of `self` in `filename` as xml content.
 		"""
-		with open(filename, 'w') as fh:
-			fh.write('<?xml version="1.0" encoding="utf-8"?>\n')
-			fh.write("<Check>")
+		with XmlReport(filename) as report:
 			for match in self.retained:
-				fh.write(match.to_xml())
-			fh.write("</Check>\n")
+				report.write(match)
+
+class _Window(object):
+	"""
+	A group of Expecteds with the same name whose tolerance windows overlap,
+	and the Messages received in their union.
+	"""
+	def __init__(self, expected, pos, start=None):
+		self.name = expected.name
+		self.start = expected.time - expected.tolerance if start is None else start
+		self.end = expected.time + expected.tolerance
+		self.expecteds = [(pos, expected)]
+		self.messages = list()
+
+
+def _windows(json_expected, max_span=None):
+	"""
+	Merges the tolerance windows of `json_expected` into disjoint `_Window` objects.
+	If `max_span` is not None, a window is not extended beyond `max_span` from its start: it is cut halfway between
+	its last Expected and the next one, that starts the next window.
+	Returns them grouped by name and sorted by start. Each window keeps its Expecteds in input order.
+	"""
+	by_name = dict()
+	for pos, e in sorted(enumerate(json_expected), key=lambda x: x[1].time - x[1].tolerance):
+		windows = by_name.setdefault(e.name, list())
+		if windows and e.time - e.tolerance <= windows[-1].end and (max_span is None or e.time + e.tolerance - windows[-1].start <= max_span):
+			windows[-1].expecteds.append((pos, e))
+			windows[-1].end = max(windows[-1].end, e.time + e.tolerance)
+		else:
+			cut = None
+			if windows and e.time - e.tolerance <= windows[-1].end: # Longer than max_span: cut, the windows stay disjoint
+				cut = windows[-1].end = min(e.time, (max(x.time for _, x in windows[-1].expecteds) + e.time) / 2)
+			windows.append(_Window(e, pos, cut))
+	for windows in by_name.values():
+		for window in windows:
+			if len(window.expecteds) > 1:
+				window.expecteds.sort(key=lambda x: x[0])
+			window.expecteds = [e for _, e in window.expecteds]
+	return by_name
+
+
+class IncrementalChecker(object):
+	"""
+	The `IncrementalChecker` checks JSON messages received in time order with a list of JSON Expecteds.
+	Only the Messages inside a still open tolerance window are kept in memory. The Matches
+	of a window are emitted as soon as a later Message closes it.
+	Overlapping tolerance windows are merged: with chained windows, as with periodic messages whose tolerance exceeds
+	half their period, one window spans the whole record, and nothing is emitted nor freed before `close`.
+	The `max_span` option bounds the windows, cut between two Expecteds: a Message is then only a candidate of the
+	Expecteds of its side of the cut, and the result can differ from Checker, which sees all the candidates.
+	"""
+	def __init__(self, json_expected, options=None):
+		"""
+		Constructor.
+		The windows are checked with the `options` (see Options), the default ones if None, in this process:
+		`jobs` is not used. If `fail_fast`, `matches` and `check` stop at the first failing Match: the Matches
+		of a window are final once it is closed, and windows are closed in time order.
+		"""
+		self.options = (Options() if options is None else options)._replace(jobs=1)
+		# Name -> starts of its windows, and the windows
+		self._by_name = {name: ([w.start for w in windows], windows) for name, windows in _windows(json_expected, self.options.max_span).items()}
+		self._open = sorted((w for _, windows in self._by_name.values() for w in windows), key=lambda w: w.end, reverse=True)
+		self._last_time = None
+		self.result = 0
+		self.status = True
+		self.failure = None
+
+	def _emit(self, matches):
+		"""
+		Updates the result with `matches` and returns them.
+		"""
+		for match in matches:
+			if match.score not in (0, -1):
+				self.result = -1
+				self.status = False
+				if self.failure is None:
+					self.failure = match
+		return matches
+
+	def _close_until(self, time):
+		"""
+		Checks the windows ending before `time`. Returns their Matches, ordered by time.
+		"""
+		closed = list()
+		while self._open and self._open[-1].end < time:
+			window = self._open.pop()
+			closed += _match(window.expecteds, window.messages, self.options)
+			window.messages = list()
+		return self._emit(sorted(closed, key=lambda x: x.msg.time if x.msg is not None else x.expected.time))
+
+	def feed(self, message):
+		"""
+		Adds `message` to the check. Messages must be fed in time order.
+		Returns the list of Match made final by `message`.
+		"""
+		if self._last_time is not None and message.time < self._last_time:
+			raise ValueError("Message at {} received after {}: messages must be in time order".format(message.time, self._last_time))
+		self._last_time = message.time
+		matches = self._close_until(message.time)
+
+		starts, windows = self._by_name.get(message.name, ((), ()))
+		pos = bisect.bisect_right(starts, message.time) - 1
+		if pos >= 0 and message.time <= windows[pos].end:
+			windows[pos].messages.append(message)
+		else:
+			matches += self._emit([Match(message, None)])
+		return matches
+
+	def close(self):
+		"""
+		Ends the check. Returns the list of Match of the windows still open.
+		"""
+		return self._close_until(float("inf"))
+
+	def matches(self, json_output):
+		"""
+		Generator feeding the Messages of the iterable `json_output` and yielding the Matches as they become final.
+		If `fail_fast`, the first failing Match is the last one, and the Messages after it are not read.
+		"""
+		for msg in json_output:
+			for match in self.feed(msg):
+				yield match
+				if self.options.fail_fast and match is self.failure:
+					return
+		for match in self.close():
+			yield match
+			if self.options.fail_fast and match is self.failure:
+				return
+
+	def check(self, json_output, filename_report=None, verbose=False):
+		"""
+		Checks the Messages of the iterable `json_output`, in time order, as they come.
+		If `verbose`, the failing Matches are printed (see VerboseReport, that `verbose` can also be).
+		Each Match is also written in the reports of the options as soon as it is final.
+		Returns 0 if OK. Returns -1 otherwise.
+
+		see also self.status and self.failure
+		"""
+		with _verbose_reports(verbose, self.options.reports) as sinks:
+			matches = self.matches(json_output)
+			if sinks:
+				matches = _written(matches, sinks)
+			if filename_report:
+				with XmlReport(filename_report) as report:
+					for match in matches:
+						report.write(match)
+			else:
+				for _ in matches:
+					pass
+		return self.result
+
+
+@contextlib.contextmanager
+def _verbose_reports(verbose, reports):
+	"""
+	Context of a check: returns the list of `reports`, plus a VerboseReport if `verbose`
+	(`verbose` itself if it is a VerboseReport), closed at the end of the check.
+	"""
+	if not verbose:
+		yield reports
+		return
+	shown = verbose if isinstance(verbose, VerboseReport) else VerboseReport()
+	yield list(reports) + [shown]
+	shown.close()
+
+
+def _written(matches, reports):
+	"""
+	Generator writing each Match of `matches` in the `reports` and yielding it.
+	"""
+	for match in matches:
+		for report in reports:
+			report.write(match)
+		yield match
+
+
+def load_expecteds(filename, cache=None):
+	"""
+	Returns the list of Expected stored in the JSON file `filename`, through the ExpectedCache `cache`, if any.
+	"""
+	if cache is not None:
+		return cache.load(filename, _expecteds, _source_digest())
+	with open(filename, encoding="utf-8") as fh:
+		return _expecteds(json.load(fh))
+
+
+def _expecteds(nodes):
+	"""
+	Returns the list of Expected of the JSON `nodes`.
+	"""
+	return [Expected(n) for n in nodes]
+
+
+@functools.lru_cache(maxsize=None)
+def _source_digest():
+	"""
+	Returns the digest of the name and of the sources of this module and of checker_scoring. Entries of ExpectedCache
+	are pickled objects of their classes, restored without their constructors: they are only read by the same code,
+	imported under the same name. Run as a script, the classes of this module are those of __main__: their enums are not
+	those of an entry written by an importer.
+	"""
+	import hashlib # pylint: disable=import-outside-toplevel
+	import checker_scoring # pylint: disable=import-outside-toplevel
+	digest = hashlib.sha256(__name__.encode())
+	for filename in (__file__, checker_scoring.__file__):
+		with open(filename, "rb") as fh:
+			digest.update(fh.read())
+	return digest.hexdigest()
+
+
+def check_files(expected, record, report, verbose=False, options=None):
+	"""
+	Checks the messages of the file `record` with the Expecteds of the file `expected`
+	and writes the xml report in the file `report`. The record is either JSON or columnar (see write_columnar).
+	The check is made with the `options` (see Options), the default ones if None.
+	Returns 0 if OK. Returns -1 otherwise.
+	"""
+	options = Options() if options is None else options
+	with _phase(options.profile, "load"):
+		msgs_expected = load_expecteds(expected, options.cache)
+	with contextlib.ExitStack() as stack:
+		columnar = stack.enter_context(ColumnarRecord(record, Message.from_fields)) if is_columnar(record) else None
+		if options.stream:
+			chk = IncrementalChecker(msgs_expected, options)
+			msgs_output = columnar if columnar is not None else (Message(n) for n in iter_records(record))
+			return chk.check(json_output=msgs_output, filename_report=report, verbose=verbose)
+		if columnar is not None:
+			msgs_output = columnar
+		else:
+			with _phase(options.profile, "load"):
+				msgs_output = [Message(n) for n in iter_records(record)]
+		chk = Checker(options)
+		return chk.check(json_expected=msgs_expected, json_output=msgs_output, filename_report=report, verbose=verbose)
+
 
 def _main(): # pragma: no cover
 	parser = argparse.ArgumentParser(description="Test Checker JSON Version {}".format(__version__))
-	parser.add_argument('-e', '--expected', type=str, help='Expected filename', required=True)
-	parser.add_argument('-r', '--record', type=str, help='Messages record filename', required=True)
-	parser.add_argument('-o', '--output', type=str, help='Put the reporting here', required=True)
-	parser.add_argument('-v', '--verbose', default=False, action='store_true', help='Display a report', required=False)
+	parser.add_argument('-e', '--expected', type=str, help='Expected filename', required=False)
+	parser.add_argument('-r', '--record', type=str, help='Messages record filename', required=False)
+	parser.add_argument('-o', '--output', type=str, help='Put the reporting here', required=False)
+	parser.add_argument('-b', '--batch', type=str, help='Manifest of (expected, record, report) scenarios to check instead of -e, -r and -o', required=False)
+	parser.add_argument('-v', '--verbose', default=False, action='store_true', help='Display the failing matches', required=False)
+	parser.add_argument('--show-all', default=False, action='store_true', help='Display all the matches with --verbose', required=False)
+	parser.add_argument('--max-shown', type=int, default=None, help='Maximum number of matches displayed with --verbose', required=False)
+	parser.add_argument('--max-fields', type=int, default=None, help='Maximum number of fields displayed per match with --verbose', required=False)
+	parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of processes checking the messages, or the scenarios with --batch (not with --stream)', required=False)
+	parser.add_argument('-s', '--stream', default=False, action='store_true', help='Check the record as it is read (in time order; overlapping tolerance windows are checked as one)', required=False)
+	parser.add_argument('--max-span', type=float, default=None, help='Maximum time span of a window checked with --stream or --fail-fast, an approximation', required=False)
+	parser.add_argument('-a', '--assignment', default="greedy", choices=[a.name.lower() for a in Assignment],
+		help='Pairing of the expecteds with their candidate messages', required=False)
+	parser.add_argument('-c', '--max-candidates', type=int, default=None, help='Number of best ranked candidate messages kept per expected (all by default)', required=False)
+	parser.add_argument('-f', '--fail-fast', default=False, action='store_true', help='Stop at the first failing match', required=False)
+	parser.add_argument('-p', '--profile', default=False, action='store_true', help='Print the time of each phase of the check and its counters (not with --batch)', required=False)
+	parser.add_argument('--profile-dump', type=str, help='Write the cProfile statistics of the check in this file (see pstats)', required=False)
+	parser.add_argument('--results', type=str, help='Also write one JSON record per match in this file (gzip if it ends with .gz, not with --batch)', required=False)
+	parser.add_argument('--append', default=False, action='store_true', help='Append the records to the --results file', required=False)
+	parser.add_argument('--cache', type=str, help='Directory caching the loaded expecteds between runs', required=False)
+	parser.add_argument('--cache-size', type=int, default=256, help='Maximum size of the --cache directory, in MB', required=False)
+	parser.add_argument('--convert', type=str, help='Convert the JSON record -r into this columnar binary record, faster to check, and exit', required=False)
 	args = parser.parse_args()
 
-	msgs_expected = [Expected(n) for n in json.load(open(args.expected))]
-	msgs_output = [Message(n) for n in json.load(open(args.record))]
-
-	chk = Checker()
-	result = chk.check(json_expected=msgs_expected, json_output=msgs_output, filename_report=args.output, verbose=args.verbose)
+	if args.convert:
+		if not args.record:
+			parser.error("the following arguments are required: -r/--record")
+		write_columnar(iter_records(args.record), args.convert)
+		exit(0)
+	options = Options(assignment=Assignment[args.assignment.upper()], fail_fast=args.fail_fast, max_candidates=args.max_candidates,
+		cache=ExpectedCache(args.cache, args.cache_size << 20) if args.cache else None, stream=args.stream, max_span=args.max_span)
+
+	if args.batch:
+		exit(run_manifest(args.batch, check_files, args.jobs, options))
+
+	if not (args.expected and args.record and args.output):
+		parser.error("the following arguments are required: -e/--expected, -r/--record, -o/--output")
+	verbose = args.verbose and VerboseReport(failures_only=not args.show_all, max_matches=args.max_shown, max_fields=args.max_fields)
+	profile = Profile() if args.profile else None
+	profiler = None
+	if args.profile_dump:
+		import cProfile # pylint: disable=import-outside-toplevel
+		profiler = cProfile.Profile()
+		profiler.enable()
+	with contextlib.ExitStack() as stack:
+		reports = [stack.enter_context(JsonLinesReport(args.results, append=args.append))] if args.results else ()
+		result = check_files(args.expected, args.record, args.output, verbose, options._replace(jobs=args.jobs, profile=profile, reports=reports))
+	if profiler is not None:
+		profiler.disable()
+		profiler.dump_stats(args.profile_dump)
+	if profile is not None:
+		print(profile, file=sys.stderr)
 	exit(result)
 
 if __name__ == "__main__": # pragma: no cover